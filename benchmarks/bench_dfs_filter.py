@@ -0,0 +1,115 @@
+"""
+比较analysis.dfs_filter（基于graph.HerbGraph的逐层遍历）与原嵌套循环实现的耗时，并验证二者的结果相同。
+Compare the run time of analysis.dfs_filter (a layer-wise traversal of a graph.HerbGraph) with the former
+nested-loop implementation and check that both give the same results.
+
+    python -m benchmarks.bench_dfs_filter
+"""
+import time
+import warnings
+
+import pandas as pd
+from herbiv import analysis, get
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+
+def dfs_filter_nested(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins):
+    """0.2版本中基于四层嵌套循环的dfs_filter，作为基准。"""
+    formula_id = set()
+    tcm_id = set()
+    chem_id = set()
+    proteins_id = set()
+
+    for f in formula['HVPID'] if (formula_tcm_links is not None) else [0]:
+        for m in tcm['HVMID'] if (formula_tcm_links is None) else set(formula_tcm_links.loc[
+                                                                        formula_tcm_links['HVPID'] == f]['HVMID']):
+            for c in set(tcm_chem_links.loc[tcm_chem_links['HVMID'] == m]['HVCID']):
+                for p in set(chem_protein_links.loc[chem_protein_links['HVCID'] == c]['Ensembl_ID']):
+                    if p in proteins['Ensembl_ID'].tolist():
+                        formula_id.add(f)
+                        tcm_id.add(m)
+                        chem_id.add(c)
+                        proteins_id.add(p)
+
+    formula = None if formula is None else formula.loc[formula['HVPID'].isin(formula_id)]
+    tcm = tcm.loc[tcm['HVMID'].isin(tcm_id)]
+    chem = chem.loc[chem['HVCID'].isin(chem_id)]
+    proteins = proteins.loc[proteins['Ensembl_ID'].isin(proteins_id)]
+    formula_tcm_links = None if formula_tcm_links is None else formula_tcm_links.loc[
+        formula_tcm_links['HVPID'].isin(formula_id) & formula_tcm_links['HVMID'].isin(tcm_id)]
+    tcm_chem_links = tcm_chem_links.loc[tcm_chem_links['HVMID'].isin(tcm_id) & tcm_chem_links['HVCID'].isin(chem_id)]
+    chem_protein_links = chem_protein_links.loc[chem_protein_links['HVCID'].isin(chem_id) &
+                                                chem_protein_links['Ensembl_ID'].isin(proteins_id)]
+
+    tcm_chem_links.index = range(tcm_chem_links.shape[0])
+    chem_protein_links.index = range(chem_protein_links.shape[0])
+    proteins.index = range(proteins.shape[0])
+
+    return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
+
+
+def forward_inputs(tcm_or_formula_id, proteins_id=None, score=990):
+    """与analysis.from_tcm_or_formula相同的dfs_filter输入。"""
+    if tcm_or_formula_id[0][2] == 'P':
+        formula = get.get_formula('HVPID', tcm_or_formula_id)
+        formula_tcm_links = get.get_formula_tcm_links('HVPID', formula['HVPID'])
+        tcm = get.get_tcm('HVMID', formula_tcm_links['HVMID'])
+    else:
+        formula = None
+        formula_tcm_links = None
+        tcm = get.get_tcm('HVMID', tcm_or_formula_id)
+    tcm_chem_links = get.get_tcm_chem_links('HVMID', tcm['HVMID'])
+    chem = get.get_chemicals('HVCID', tcm_chem_links['HVCID'])
+    chem_protein_links = get.get_chem_protein_links('HVCID', chem['HVCID'], score)
+    proteins = get.get_proteins('Ensembl_ID', chem_protein_links['Ensembl_ID'] if proteins_id is None else proteins_id)
+    return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
+
+
+def reverse_inputs(proteins_id, score=0):
+    """与analysis.from_proteins相同的dfs_filter输入。"""
+    proteins = get.get_proteins('Ensembl_ID', proteins_id)
+    chem_protein_links = get.get_chem_protein_links('Ensembl_ID', proteins['Ensembl_ID'], score)
+    chem = get.get_chemicals('HVCID', chem_protein_links['HVCID'])
+    tcm_chem_links = get.get_tcm_chem_links('HVCID', chem['HVCID'])
+    tcm = get.get_tcm('HVMID', tcm_chem_links['HVMID'])
+    formula_tcm_links = get.get_formula_tcm_links('HVMID', tcm['HVMID'])
+    formula = get.get_formula('HVPID', formula_tcm_links['HVPID'])
+    return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
+
+
+WORKLOADS = {
+    'formula HVP1625, score=990': lambda: forward_inputs(['HVP1625']),
+    'tcm HVM0367+HVM1695, score=0': lambda: forward_inputs(['HVM0367', 'HVM1695'], score=0),
+    'proteins ENSP00000381588+ENSP00000252519, score=900': lambda: reverse_inputs(
+        ['ENSP00000381588', 'ENSP00000252519'], 900),
+    'proteins ENSP00000381588+ENSP00000252519, score=0': lambda: reverse_inputs(
+        ['ENSP00000381588', 'ENSP00000252519'], 0),
+}
+
+
+def timed(func, inputs):
+    start = time.perf_counter()
+    result = func(*inputs)
+    return time.perf_counter() - start, result
+
+
+def main():
+    print(f"{'workload':<55}{'links':>10}{'nested (s)':>14}{'HerbGraph (s)':>16}{'speedup':>10}")
+    for name, make_inputs in WORKLOADS.items():
+        inputs = make_inputs()
+        nested_time, expected = timed(dfs_filter_nested, inputs)
+        set_time, result = timed(analysis.dfs_filter, inputs)
+
+        for a, b in zip(expected, result):
+            if a is None or b is None:
+                assert a is None and b is None
+            else:
+                pd.testing.assert_frame_equal(a, b)
+
+        links = sum(len(x) for x in inputs[1::2] if x is not None)
+        print(f'{name:<55}{links:>10}{nested_time:>14.3f}{set_time:>16.4f}{nested_time / set_time:>10.0f}x')
+
+
+if __name__ == '__main__':
+    main()
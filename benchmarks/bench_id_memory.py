@@ -0,0 +1,78 @@
+"""
+比较数据集中ID列以字符串（对象数组，即pandas.read_csv的结果）和以Categorical（整数编码，即dataset缓存中的表示）
+存储时的内存占用，以及isin、==和copy的耗时。
+Compare the memory usage of the datasets with their ID columns stored as strings (object arrays, as returned by
+pandas.read_csv) and as Categorical (integer codes, as held in the dataset cache), and the time of isin, == and copy.
+
+    python -m benchmarks.bench_id_memory
+
+内存为tracemalloc追踪到的实际分配（共用的字符串对象只计一次）；deep为DataFrame.memory_usage(deep=True)的结果。
+Memory is the allocation traced by tracemalloc (shared string objects are counted once);
+deep is the result of DataFrame.memory_usage(deep=True).
+"""
+import gc
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+from herbiv import dataset
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+
+def traced(function):
+    """返回function()的返回值及其在返回后仍占用的内存（字节）。"""
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        gc.collect()
+        return result, tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def best(function, repeat=5):
+    """function()耗时的最小值（毫秒）。"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times) * 1000
+
+
+def main():
+    rng = np.random.default_rng(0)
+    totals = np.zeros(2)
+    print(f'{"dataset":<20} {"rows":>8} {"object MB":>10} {"codes MB":>9} {"deep obj":>9} {"deep cat":>9}  '
+          f'{"isin ms":>15} {"== ms":>13} {"copy ms":>13}')
+    for name in dataset.TABLES:
+        columns = [column for column in dataset.KEY_COLUMNS
+                   if column in pd.read_csv(dataset.path(name), nrows=0).columns]
+        if not columns:
+            continue
+
+        objects, object_bytes = traced(lambda: pd.read_csv(dataset.path(name)))
+        codes, code_bytes = traced(lambda: dataset._encode(pd.read_csv(dataset.path(name))))
+        totals += object_bytes, code_bytes
+
+        # 以第一个键列比较isin（100个ID）、==（1个ID）及整表copy的耗时
+        column = columns[0]
+        items = rng.choice(objects[column].dropna().unique(), 100).tolist()
+        timings = [(best(lambda: frame[column].isin(items)), best(lambda: frame[column] == items[0]),
+                    best(lambda: frame.copy())) for frame in (objects, codes)]
+
+        print(f'{name:<20} {len(objects):>8} {object_bytes / 2 ** 20:>10.1f} {code_bytes / 2 ** 20:>9.1f} '
+              f'{objects.memory_usage(deep=True).sum() / 2 ** 20:>9.1f} '
+              f'{codes.memory_usage(deep=True).sum() / 2 ** 20:>9.1f}  '
+              + '  '.join(f'{a:6.2f} -> {b:5.2f}' for a, b in zip(*timings)))
+
+    print(f'{"total":<20} {"":>8} {totals[0] / 2 ** 20:>10.1f} {totals[1] / 2 ** 20:>9.1f}  '
+          f'({totals[1] / totals[0]:.0%} of the object layout)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+以固定的工作负载（README与analysis.py中的示例）分别测量分析流程各阶段的耗时与内存峰值，
+将结果写入json文件，并可与保存的基准结果比较。
+Time and memory-profile each stage of the analysis pipeline (get_*, dfs_filter, score, component,
+re_name, vis) on fixed workloads taken from the README and analysis.py examples,
+write the results as json and optionally compare them against a stored baseline.
+
+    python -m benchmarks.bench_pipeline                                  # 运行并打印结果
+    python -m benchmarks.bench_pipeline --save benchmarks/baseline.json  # 在修改前的代码上保存基准
+    python -m benchmarks.bench_pipeline --baseline benchmarks/baseline.json --output result.json
+    python -m benchmarks.bench_pipeline --data-dir /data/herbiv_x10           # 在放大的数据集上运行
+
+耗时取repeat次运行的最小值（不启用tracemalloc），内存峰值在另一次启用tracemalloc的运行中测量。
+与基准比较时，耗时或内存峰值超过基准(1 + tolerance)倍（另加少量绝对余量）的阶段记为退化，此时以状态码1退出。
+Time is the minimum over --repeat runs without tracemalloc; peak memory is measured in a separate traced run.
+Stages slower or larger than (1 + --tolerance) times the baseline are reported as regressions (exit status 1).
+
+基准结果取决于机器和数据集（HerbiV_chemical_protein_links.csv不随仓库分发），因此不纳入版本库
+（benchmarks/baseline.json已在.gitignore中忽略）：先在修改前的代码上以--save在本机生成，修改后再以--baseline比较；
+硬件或数据集变化后需重新生成。基准中记录了各数据集的行数，与当前数据集不一致时给出警告。
+The baseline depends on the machine and the datasets (HerbiV_chemical_protein_links.csv is not shipped with the
+repository), so it is not committed (benchmarks/baseline.json is ignored by git): record it locally with --save on
+the code before a change, compare with --baseline after it, and record it again whenever the hardware or the
+datasets change. The baseline stores the row count of each dataset and a warning is printed when they differ.
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import warnings
+from contextlib import redirect_stderr
+
+import numpy as np
+import pandas as pd
+from herbiv import analysis, compute, output, dataset, cache
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+PROTEINS = ['ENSP00000381588', 'ENSP00000252519']
+
+# 工作负载：名称 -> (分析方向, ID, score)。Workloads: name -> (direction, IDs, score).
+WORKLOADS = {
+    f'{name}@{score}': (direction, ids, score)
+    for name, direction, ids in [('formula:HVP1625', 'forward', ['HVP1625']),
+                                 ('tcm:HVM0367+HVM1695', 'forward', ['HVM0367', 'HVM1695']),
+                                 ('proteins:' + '+'.join(PROTEINS), 'reverse', PROTEINS)]
+    for score in (0, 990)
+}
+
+# 比较时额外允许的绝对差值，避免耗时仅数毫秒的阶段因噪声被记为退化
+SLACK = {'seconds': 0.005, 'peak_bytes': 64 * 1024}
+
+
+def rows(result):
+    """result中各DataFrame的总行数。"""
+    frames = result if isinstance(result, tuple) else (result,)
+    return int(sum(frame.shape[0] for frame in frames if isinstance(frame, pd.DataFrame)))
+
+
+def pipeline(direction, ids, score, num, path):
+    """
+    依次执行各阶段，逐个产出(阶段名, 执行该阶段的函数)。函数的返回值作为后续阶段的输入。
+    Yield (stage, thunk) for each stage in order; the return value of each thunk feeds the later stages.
+    """
+    state = {}
+
+    def get():
+        if direction == 'forward':
+            state['network'] = analysis._forward_network(ids, None, score)
+        else:
+            state['network'] = analysis._reverse_network(ids, score)
+        return state['network']
+
+    def dfs_filter():
+        state['network'] = analysis.dfs_filter(*state['network'])
+        return state['network']
+
+    def score_():
+        formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = state['network']
+        tcm, chem, formula = compute.score(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links)
+        state['network'] = formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
+        return tcm, chem, formula
+
+    def component():
+        formula, _, tcm = state['network'][:3]
+        # 屏蔽优化模型的进度条
+        with redirect_stderr(io.StringIO()):
+            tcms = compute.component(tcm.loc[tcm['Importance Score'] != 1.0], 0, num)
+            formulas = compute.component(formula.loc[formula['Importance Score'] != 1.0], 0, num)
+        return tcms, formulas
+
+    def re_name():
+        return output.re_name(*state['network'][2:])
+
+    def vis():
+        output.vis(*state['network'][2:], path=path)
+
+    yield 'get', get
+    yield 'dfs_filter', dfs_filter
+    yield 'score', score_
+    if direction == 'reverse':
+        yield 'component', component
+    yield 're_name', re_name
+    yield 'vis', vis
+
+
+def measure(direction, ids, score, num, repeat, path):
+    """返回各阶段的耗时（秒，repeat次中的最小值）、内存峰值（字节）和输出行数。"""
+    # 预热一次，排除首次调用时的导入等一次性开销
+    for _, thunk in pipeline(direction, ids, score, num, path):
+        thunk()
+
+    results = {}
+    for _ in range(repeat):
+        for stage, thunk in pipeline(direction, ids, score, num, path):
+            start = time.perf_counter()
+            result = thunk()
+            elapsed = time.perf_counter() - start
+            entry = results.setdefault(stage, {'seconds': elapsed, 'rows': rows(result)})
+            entry['seconds'] = min(entry['seconds'], elapsed)
+
+    tracemalloc.start()
+    try:
+        for stage, thunk in pipeline(direction, ids, score, num, path):
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            thunk()
+            results[stage]['peak_bytes'] = tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return results
+
+
+def measure_load():
+    """从磁盘（列式存储或CSV）读取全部数据集的耗时与内存峰值。"""
+    dataset.clear()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        dataset.preload()
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    dataset.clear()
+    start = time.perf_counter()
+    dataset.preload()
+    return {'load': {'seconds': min(elapsed, time.perf_counter() - start), 'peak_bytes': peak,
+                     'rows': sum(dataset.load(name).shape[0] for name in dataset.TABLES)}}
+
+
+def run(workloads, num, repeat):
+    results = {'dataset': measure_load()}
+    dataset_rows = {name: int(dataset.load(name).shape[0]) for name in dataset.TABLES}
+    with tempfile.TemporaryDirectory() as path:
+        for name in workloads:
+            direction, ids, score = WORKLOADS[name]
+            results[name] = measure(direction, ids, score, num, repeat, path)
+    return {
+        'meta': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+                 'platform': platform.platform(), 'dataset_version': dataset.version(),
+                 'dataset_rows': dataset_rows, 'num': num, 'repeat': repeat},
+        'results': results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """打印与基准的比值，返回退化的(工作负载, 阶段, 指标)列表。"""
+    regressions = []
+    # 数据集版本包含目录和修改时间，换一台机器即不同，因此以各数据集的行数判断基准是否在同一数据集上生成
+    if baseline['meta'].get('dataset_rows', current['meta']['dataset_rows']) != current['meta']['dataset_rows']:
+        print('warning: baseline was recorded on datasets with different row counts')
+    print(f'{"workload":<44} {"stage":<11} {"time":>9} {"x base":>7} {"peak MB":>9} {"x base":>7}')
+    for workload, stages in current['results'].items():
+        for stage, entry in stages.items():
+            base = baseline['results'].get(workload, {}).get(stage)
+            ratios = {}
+            for metric in ('seconds', 'peak_bytes'):
+                if base and base.get(metric):
+                    ratios[metric] = entry[metric] / base[metric]
+                    if entry[metric] > base[metric] * (1 + tolerance) + SLACK[metric]:
+                        regressions.append((workload, stage, metric))
+            print(f'{workload:<44} {stage:<11} {entry["seconds"] * 1000:7.1f}ms '
+                  f'{ratios.get("seconds", float("nan")):7.2f} {entry["peak_bytes"] / 2 ** 20:9.1f} '
+                  f'{ratios.get("peak_bytes", float("nan")):7.2f}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workload', nargs='+', choices=list(WORKLOADS), default=list(WORKLOADS),
+                        help='要运行的工作负载，默认为全部')
+    parser.add_argument('--num', type=int, default=100, help='优化模型生成的解的组数')
+    parser.add_argument('--repeat', type=int, default=3, help='计时的重复次数，取最小值')
+    parser.add_argument('--output', '-o', help='结果json文件的路径')
+    parser.add_argument('--save', help='将结果保存为基准json文件')
+    parser.add_argument('--baseline', '-b', help='用于比较的基准json文件')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='允许超过基准的比例')
+    parser.add_argument('--data-dir', help='数据集所在的目录（如benchmarks/generate_data.py生成的放大数据集）')
+    args = parser.parse_args()
+    if args.baseline and not os.path.exists(args.baseline):
+        parser.error(f'baseline {args.baseline} not found; record one first with --save {args.baseline}')
+
+    # 不使用分析结果缓存，以测量实际的计算耗时
+    cache.disable()
+    if args.data_dir:
+        dataset.set_data_dir(args.data_dir)
+    current = run(args.workload, args.num, args.repeat)
+
+    for file in (args.output, args.save):
+        if file:
+            with open(file, 'w') as f:
+                json.dump(current, f, indent=2)
+
+    baseline = {'meta': {}, 'results': {}}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(current, baseline, args.tolerance)
+
+    if regressions:
+        print(f'{len(regressions)} regression(s) over {args.tolerance:.0%}:')
+        for workload, stage, metric in regressions:
+            print(f'  {workload} {stage} {metric}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+比较多个工作进程各自读取数据集（load）与通过dataset.shared共用内存映射的列式存储（shared）时，每个工作进程的私有内存。
+Compare the private memory of each worker process when every worker reads its own copy of the datasets (load)
+and when the workers share the memory-mapped columnar stores of dataset.shared (shared).
+
+    python -m benchmarks.bench_shared_workers [--workers 4] [--data-dir /data/herbiv_x10]
+
+每个工作进程执行一次正向与一次逆向分析的取数阶段后，报告/proc/self/smaps_rollup中的私有内存（Private_Clean +
+Private_Dirty）、RSS与PSS；没有smaps_rollup的系统上以ru_maxrss代替私有内存。
+shared模式下私有内存应与数据集大小无关，在放大的数据集上（benchmarks/generate_data.py）差别更明显。
+Each worker runs the data-fetching stage of one forward and one reverse analysis and then reports its private
+memory (Private_Clean + Private_Dirty), RSS and PSS from /proc/self/smaps_rollup; ru_maxrss stands in for the
+private memory on systems without smaps_rollup. In shared mode the private memory should not depend on the size
+of the datasets, which is clearer on scaled-up datasets (benchmarks/generate_data.py).
+"""
+import os
+import argparse
+import warnings
+import multiprocessing
+from contextlib import nullcontext
+
+from herbiv import analysis, dataset
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+PROTEINS = ['ENSP00000381588', 'ENSP00000252519']
+
+
+def memory():
+    """当前进程的私有内存、RSS与PSS（字节）。"""
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = {line.split(':')[0]: int(line.split()[1]) * 1024 for line in f if line.strip().endswith('kB')}
+        return fields['Private_Clean'] + fields['Private_Dirty'], fields['Rss'], fields['Pss']
+    except FileNotFoundError:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return rss, rss, float('nan')
+
+
+def work(mode, queue):
+    """工作进程：按mode准备数据集，执行取数阶段，并将内存占用放入queue。"""
+    if mode == 'load':
+        dataset.preload()
+    analysis._forward_network(['HVP1625'], None, 0)
+    analysis._reverse_network(PROTEINS, 0)
+    queue.put(memory())
+
+
+def run(mode, workers):
+    """以mode启动workers个工作进程，返回各进程的(私有内存, RSS, PSS)。"""
+    dataset.clear()
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+    with dataset.shared() if mode == 'shared' else nullcontext():
+        queue = context.Queue()
+        processes = [context.Process(target=work, args=(mode, queue)) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        results = [queue.get() for _ in processes]
+        for process in processes:
+            process.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=4, help='工作进程数')
+    parser.add_argument('--data-dir', help='数据集所在的目录（如benchmarks/generate_data.py生成的放大数据集）')
+    args = parser.parse_args()
+
+    if args.data_dir:
+        dataset.set_data_dir(args.data_dir)
+    print(f'{"mode":<8} {"private MB":>11} {"rss MB":>9} {"pss MB":>9}  (mean of {args.workers} workers)')
+    for mode in ('load', 'shared'):
+        results = run(mode, args.workers)
+        private, rss, pss = (sum(values) / len(values) / 2 ** 20 for values in zip(*results))
+        print(f'{mode:<8} {private:>11.1f} {rss:>9.1f} {pss:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
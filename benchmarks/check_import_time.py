@@ -0,0 +1,68 @@
+"""
+检查herbiv与herbiv-cli.py的导入耗时：在子进程中以 -X importtime 导入，
+确认pyecharts、tqdm、http.server等仅在使用时才导入的模块未被导入，且累计耗时不超过预算。
+Check the import time of herbiv and herbiv-cli.py: import them in a subprocess with -X importtime,
+make sure that lazily imported modules (pyecharts, tqdm, http.server, ...) are not loaded
+and that the cumulative import time stays within the budget.
+
+    python -m benchmarks.check_import_time [--budget 1500] [--repeat 3]
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 仅在绘图、显示进度、多进程或serve模式时才应导入的模块
+LAZY = ('pyecharts', 'tqdm', 'concurrent.futures.process', 'http.server', 'socketserver')
+
+# 待检查的导入语句。Import statements to be checked.
+TARGETS = {
+    'herbiv.analysis': 'import herbiv.analysis',
+    'herbiv-cli.py': "import runpy; runpy.run_path('herbiv-cli.py', run_name='herbiv_cli')",
+}
+
+
+def import_time(statement):
+    """
+    在新的解释器中执行statement，返回(总耗时ms, 导入的模块名集合)。
+    Run statement in a fresh interpreter and return (total time in ms, set of imported modules).
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                             cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    total, modules = 0, set()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # 仅累加顶层导入的耗时
+        if not name[1:].startswith(' '):
+            total += int(cumulative)
+        modules.add(name.strip())
+    return total / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget', type=float, default=1500, help='导入耗时预算(ms)')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数，取最小值')
+    args = parser.parse_args()
+
+    failed = False
+    for target, statement in TARGETS.items():
+        runs = [import_time(statement) for _ in range(args.repeat)]
+        elapsed = min(total for total, _ in runs)
+        loaded = sorted(name for name in LAZY if name in runs[0][1])
+        ok = elapsed <= args.budget and not loaded
+        failed |= not ok
+        print(f'{target:<16} {elapsed:8.1f} ms (budget {args.budget:.0f} ms) {"ok" if ok else "FAILED"}')
+        if loaded:
+            print(f'  eagerly imported: {", ".join(loaded)}')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+"""
+生成与HerbiV数据集结构相同、统计特征相似的放大数据集，用于在更大规模的数据上运行基准测试和压力测试。
+Generate scaled-up datasets with the same layout and similar statistics as the HerbiV datasets,
+so that benchmarks and stress tests can run on data much larger than the bundled tables.
+
+    python -m benchmarks.generate_data --scale 10 --output /data/herbiv_x10 [--convert]
+    HERBIV_DATA_DIR=/data/herbiv_x10 python -m benchmarks.bench_pipeline
+
+原有的复方、中药、化合物、蛋白及其连接全部保留（示例中的ID仍可查询），新增的实体按原数据集的行重采样并赋予新的ID。
+新实体的连接数从原连接表中该侧实体的度分布（含度为0的实体）中抽样，另一端按其度（新实体的度同样从度分布中抽样）
+成比例地选取，因此两侧的度分布形状与原数据集一致；Combined_score从原分数中重采样，分布与原数据集一致。
+All original entities and links are kept (the IDs in the examples can still be queried). New entities are
+resampled rows of the original tables with new IDs. The number of links of each new entity is drawn from the
+degree distribution of its side of the original link table (entities without links included), and the other end
+is chosen in proportion to its degree (drawn from the degree distribution for new entities), so both degree
+distributions keep the shape of the original ones. Combined_score is resampled from the original scores.
+"""
+import os
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+from herbiv import dataset
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+# 实体数据集及其ID列。Entity datasets and their ID columns.
+ENTITIES = {'formula': 'HVPID', 'tcm': 'HVMID', 'chemicals': 'HVCID', 'proteins': 'Ensembl_ID'}
+
+# 连接数据集：(名称, 生成新连接的一侧, 另一侧)。Link datasets: (name, side of the new links, other side).
+LINKS = [('formula_tcm_links', 'formula', 'tcm'),
+         ('tcm_chem_links', 'tcm', 'chemicals'),
+         ('chem_protein_links', 'chemicals', 'proteins')]
+
+# 每块生成的连接数的上限。Upper bound of the number of links generated per chunk.
+CHUNK = 1_000_000
+
+
+def new_ids(ids, count):
+    """在ids中最大编号之后依次生成count个格式相同（前缀+定宽数字）的新ID。"""
+    parts = pd.Series(ids).str.extract(r'^(\D*)(\d+)$')
+    prefix, width = parts[0].iloc[0], parts[1].str.len().max()
+    start = parts[1].astype(np.int64).max() + 1
+    return np.array([f'{prefix}{number:0{width}d}' for number in range(start, start + count)], dtype=object)
+
+
+def scale_entities(frame, by, scale, rng):
+    """
+    重采样frame中的行并赋予新的ID，使不同ID的个数变为原来的scale倍。
+    返回原有的行及新增的行，以及全部ID（原有的ID去重后在前）和原有ID的个数。
+    Resample rows of frame and give them new IDs, so that the number of distinct IDs grows scale times.
+    Return the original and the new rows, all IDs (the distinct original IDs first)
+    and the number of distinct original IDs.
+    """
+    original = pd.unique(frame[by])
+    count = int(round(len(original) * (scale - 1)))
+    extra = frame.iloc[rng.integers(0, len(frame), count)].copy()
+    extra[by] = new_ids(frame[by], count)
+    return pd.concat([frame, extra], ignore_index=True), np.concatenate([original, extra[by]]), len(original)
+
+
+def degrees(codes, n):
+    """以整数编码表示的连接端点中，n个实体各自的度（连接数）。"""
+    return np.bincount(codes, minlength=n)
+
+
+def scale_links(links, a, b, a_ids, b_ids, n_a, n_b, file, rng, score=None):
+    """
+    保留原有的连接，为a_ids中新增的实体（第n_a个起）生成连接，另一端按度成比例地从b_ids中选取，逐块写入file。
+    返回原数据集与生成数据集中a、b两侧的度，以及分数（若有）的直方图。
+    Keep the original links, generate links for the new entities of a_ids (from the n_a-th on) whose other ends
+    are chosen from b_ids in proportion to their degrees, and write them chunk by chunk to file.
+    Return the degrees of both sides in the original and the generated dataset and the histograms of the scores.
+    """
+    links.to_csv(file, index=False)
+
+    # 不在实体表中的ID与原数据集一样保留在连接表中，但不参与度的计算
+    a_codes = pd.Index(a_ids).get_indexer(links[a])
+    b_codes = pd.Index(b_ids).get_indexer(links[b])
+    known = (a_codes >= 0) & (b_codes >= 0)
+    a_degrees = degrees(a_codes[known], len(a_ids))
+    b_degrees = degrees(b_codes[known], len(b_ids))
+    original = a_degrees[:n_a].copy(), b_degrees[:n_b].copy()
+
+    # 新实体的度从原度分布中抽样，另一端按度（新实体的度同样抽样得到）成比例地选取
+    new_degrees = rng.choice(original[0], len(a_ids) - n_a)
+    weights = np.concatenate([original[1], rng.choice(original[1], len(b_ids) - n_b)]).astype(np.float64)
+    cdf = np.cumsum(weights)
+
+    bins = np.arange(0, 1100, 100)
+    scores = None if score is None else links[score].to_numpy()
+    histograms = None if score is None else [np.histogram(scores, bins)[0], np.histogram(scores, bins)[0]]
+
+    # 按新实体分块，每块约CHUNK个连接，同一实体的连接在同一块中去重
+    blocks = np.cumsum(new_degrees) // CHUNK
+    bounds = np.flatnonzero(np.diff(blocks)) + 1
+    for start, stop in zip(np.r_[0, bounds], np.r_[bounds, len(new_degrees)]):
+        sources = np.repeat(np.arange(n_a + start, n_a + stop), new_degrees[start:stop])
+        targets = np.searchsorted(cdf, rng.random(len(sources)) * cdf[-1], side='right')
+        chunk = pd.DataFrame({'a': sources, 'b': np.minimum(targets, len(cdf) - 1)}).drop_duplicates()
+        frame = pd.DataFrame({a: a_ids[chunk['a'].to_numpy()], b: b_ids[chunk['b'].to_numpy()]})
+        if score is not None:
+            frame[score] = rng.choice(scores, len(frame))
+            histograms[1] += np.histogram(frame[score], bins)[0]
+        frame.to_csv(file, mode='a', header=False, index=False)
+        a_degrees += degrees(chunk['a'].to_numpy(), len(a_ids))
+        b_degrees += degrees(chunk['b'].to_numpy(), len(b_ids))
+
+    return original, (a_degrees, b_degrees), histograms
+
+
+def describe(values):
+    """度分布的摘要：均值及50%、90%、99%分位数和最大值。"""
+    return (f'mean {np.mean(values):7.2f}  p50 {np.percentile(values, 50):5.0f}  '
+            f'p90 {np.percentile(values, 90):5.0f}  p99 {np.percentile(values, 99):6.0f}  max {np.max(values):6.0f}')
+
+
+def generate(output, scale=10, source=None, seed=0):
+    """
+    将source目录（默认为当前数据集目录）中的数据集放大scale倍写入output目录，并打印两者的度分布与分数分布。
+    Write the datasets of the directory source (the current data directory by default) scaled up by scale
+    to the directory output, and print the degree and score distributions of both.
+    """
+    rng = np.random.default_rng(seed)
+    if source is not None:
+        dataset.set_data_dir(source)
+    if os.path.abspath(output) == os.path.abspath(dataset.data_dir()):
+        raise ValueError('The output directory must differ from the source data directory.')
+    os.makedirs(output, exist_ok=True)
+
+    ids = {}
+    for name, by in ENTITIES.items():
+        frame = dataset.load(name)
+        scaled, ids[name], n = scale_entities(frame, by, scale, rng)
+        scaled.to_csv(os.path.join(output, dataset.TABLES[name]), index=False)
+        ids[name] = ids[name], n
+        print(f'{name:<20} {len(frame):>10} -> {len(scaled):>10} rows')
+
+    for name, a_name, b_name in LINKS:
+        links = dataset.load(name)
+        a, b = ENTITIES[a_name], ENTITIES[b_name]
+        (a_ids, n_a), (b_ids, n_b) = ids[a_name], ids[b_name]
+        score = 'Combined_score' if 'Combined_score' in links.columns else None
+        original, generated, histograms = scale_links(links, a, b, a_ids, b_ids, n_a, n_b,
+                                                      os.path.join(output, dataset.TABLES[name]), rng, score)
+        print(f'{name:<20} {len(links):>10} -> {len(links) - original[0].sum() + generated[0].sum():>10} rows')
+        for side, column in enumerate((a, b)):
+            print(f'  {column:<11} degree  source    {describe(original[side])}')
+            print(f'  {"":<11}         generated {describe(generated[side])}')
+        if score is not None:
+            for label, histogram in zip(('source', 'generated'), histograms):
+                print(f'  {score} {label:<9} ' + ' '.join(f'{share:5.3f}' for share in histogram / histogram.sum()))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', '-o', required=True, help='生成的数据集的目录')
+    parser.add_argument('--scale', type=float, default=10, help='放大的倍数，如10或100')
+    parser.add_argument('--source', help='原数据集的目录，默认为当前数据集目录')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+    parser.add_argument('--convert', action='store_true', help='生成后转换为列式存储')
+    args = parser.parse_args()
+
+    generate(args.output, args.scale, args.source, args.seed)
+    if args.convert:
+        dataset.set_data_dir(args.output)
+        dataset.convert()
+
+
+if __name__ == '__main__':
+    main()
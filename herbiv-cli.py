@@ -1,9 +1,15 @@
 #!/usr/bin/python3
+import io
+import os
+import sys
 import json
+import time
 import argparse
-import numpy as np
+import threading
+from urllib.parse import urlparse, parse_qs
 import pandas as pd
 from herbiv import analysis
+from herbiv import dataset
 import warnings
 # 消除 pandas Future Warning
 warnings.simplefilter(action='ignore', category=FutureWarning)
@@ -52,148 +58,209 @@ def check_id(ids: list[str], check_fun) -> bool:
     return True
 
 
-def json_prettier(json_str: str):
+def column_values(column: pd.Series) -> list:
     """
-    输出格式化的 json 字符串
+    将一列转换为可直接编码为 json 的 Python 对象列表，NaN（及字符串 'nan'）转换为 None
     Args:
-        json_str: 未格式化的 json 字符串
-    Returns: 格式化后的 json 字符串
+        column: DataFrame 的一列
+    Returns: Python 对象列表
     """
-    _dict = json.loads(json_str)
-    pretty_json = json.dumps(_dict, sort_keys=True, indent=4, separators=(',', ':'), ensure_ascii=False)
-    print(pretty_json)
+    missing = column.isna()
+    if column.dtype == object:
+        missing |= column.astype(str) == 'nan'
+    if not missing.any():
+        return column.tolist()
+    return column.astype(object).where(~missing, None).tolist()
 
 
-def nan_converter(data: pd.DataFrame):
+def iter_records(data: pd.DataFrame):
     """
-    为了解决 json 不支持 NaN 的问题，将 data 中的 NaN 转化为 None
+    逐行生成 data 的记录（dict），各列按列一次性转换，NaN 编码为 None
     Args:
-        data:
-    Returns:
+        data: DataFrame
+    Returns: 记录的生成器
     """
-    data.replace(np.nan, None, inplace=True)
-    return data.where((data.applymap(lambda x: True if str(x) != 'nan' else False)), None)
+    columns = [str(column) for column in data.columns]
+    values = [column_values(data.iloc[:, i]) for i in range(data.shape[1])]
+    for row in zip(*values):
+        yield dict(zip(columns, row))
 
 
-def from_tcm(tcms: list[str], score: int, path: str):
+def write_json(result: dict, stream, prettier=False, ndjson=False):
+    """
+    将分析结果以 json 流式写入 stream，逐条写入记录而不在内存中构建完整的 json 字符串
+    Args:
+        result:   表名 -> DataFrame（或可直接编码为 json 的值，如错误信息）
+        stream:   可写入字符串的文件对象，如 sys.stdout
+        prettier: 输出格式化的 json（键排序、缩进 4 个空格）
+        ndjson:   每行输出一条记录 {"table": 表名, "record": 记录}，非 DataFrame 的值输出为 {表名: 值}
+    """
+    if ndjson:
+        for name, data in result.items():
+            if isinstance(data, pd.DataFrame):
+                for record in iter_records(data):
+                    stream.write(json.dumps({'table': name, 'record': record}, ensure_ascii=False) + '\n')
+            else:
+                stream.write(json.dumps({name: data}, ensure_ascii=False) + '\n')
+        return
+
+    if prettier:
+        dumps = lambda value: json.dumps(value, sort_keys=True, indent=4, separators=(',', ':'), ensure_ascii=False)
+        names = sorted(result)
+        item_sep, key_sep, open_list, close_list = ',\n', ':', '[\n', '\n    ]'
+    else:
+        dumps = json.dumps
+        names = list(result)
+        item_sep, key_sep, open_list, close_list = ', ', ': ', '[', ']'
+
+    stream.write('{\n    ' if prettier and names else '{')
+    for i, name in enumerate(names):
+        if i:
+            stream.write(',\n    ' if prettier else ', ')
+        stream.write(dumps(name) + key_sep)
+        data = result[name]
+        if not isinstance(data, pd.DataFrame):
+            stream.write(dumps(data).replace('\n', '\n    ') if prettier else dumps(data))
+            continue
+        if data.empty:
+            stream.write('[]')
+            continue
+        stream.write(open_list)
+        for j, record in enumerate(iter_records(data)):
+            if j:
+                stream.write(item_sep)
+            stream.write('        ' + dumps(record).replace('\n', '\n        ') if prettier else dumps(record))
+        stream.write(close_list)
+    stream.write('\n}\n' if prettier and names else '}\n')
+
+
+def from_tcm(tcms: list[str], score: int, path: str, top: int = None, max_bytes: int = None):
     """
     给定中药分析
     Args:
         tcms: 中药 id 列表, 如 ['HVM0367', 'HVM1695']
         score:
-        path: 图像输出路径
-    Returns:
+        path: 图像输出路径，为 None 时不输出文件
+        top: Graph.html 中每类节点最多保留的个数，为 None 时保留全部节点
+        max_bytes: Graph.html 的大小上限（字节），为 None 时不限制
+    Returns: 表名 -> DataFrame 的 dict，ID 有误时为 {"msg": 错误信息}
     """
     if not check_id(tcms, check_tcm_id):
-        return json.dumps({'msg': 'Wrong TCM ID'})
-    result = analysis.from_tcm_or_formula(tcms, score=score, path=path)
-    tmp = []
-    for e in result:
-        tmp.append(nan_converter(e))
-    tcm, tcm_chem_links, chem, chem_protein_links, proteins = tmp
-
-    return json.dumps({
-        'tcm':               tcm.to_dict(orient='records'),
-        'tcm_chem_link':     tcm_chem_links.to_dict(orient='records'),
-        'chem':              chem.to_dict(orient='records'),
-        'chem_protein_link': chem_protein_links.to_dict(orient='records'),
-        'protein':           proteins.to_dict(orient='records')
-    })
-
-
-def from_formula(formulas: list[str], score: int, path):
+        return {'msg': 'Wrong TCM ID'}
+    result = analysis.from_tcm_or_formula(tcms, score=score, path=path,
+                                          out_for_cytoscape=path is not None, out_graph=path is not None,
+                                          top=top, max_bytes=max_bytes)
+    tcm, tcm_chem_links, chem, chem_protein_links, proteins = result
+
+    return {
+        'tcm':               tcm,
+        'tcm_chem_link':     tcm_chem_links,
+        'chem':              chem,
+        'chem_protein_link': chem_protein_links,
+        'protein':           proteins
+    }
+
+
+def from_formula(formulas: list[str], score: int, path, top: int = None, max_bytes: int = None):
     """
     给定复方分析
     Args:
         formulas: 复方 id 列表, 如 ['HVP1625']
         score:
-        path:     图像输出路径
-    Returns:
+        path:     图像输出路径，为 None 时不输出文件
+        top:       Graph.html 中每类节点最多保留的个数，为 None 时保留全部节点
+        max_bytes: Graph.html 的大小上限（字节），为 None 时不限制
+    Returns: 表名 -> DataFrame 的 dict，ID 有误时为 {"msg": 错误信息}
     """
     if not check_id(formulas, check_formula_id):
-        return json.dumps({'msg': 'Wrong formula ID'})
-    result = analysis.from_tcm_or_formula(formulas, score=score, path=path)
-    tmp = []
-    for e in result:
-        tmp.append(nan_converter(e))
-    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = tmp
-    return json.dumps({
-        'formula':            formula.to_dict(orient='records'),
-        'formula_tcm_links':  formula_tcm_links.to_dict(orient='records'),
-        'tcm':                tcm.to_dict(orient='records'),
-        'tcm_chem_links':     tcm_chem_links.to_dict(orient='records'),
-        'chem':               chem.to_dict(orient='records'),
-        'chem_protein_links': chem_protein_links.to_dict(orient='records'),
-        'proteins':           proteins.to_dict(orient='records'),
-    })
-
-
-def from_tcm_protein(tcms: list[str], proteins: list[str], score: int, path):
+        return {'msg': 'Wrong formula ID'}
+    result = analysis.from_tcm_or_formula(formulas, score=score, path=path,
+                                          out_for_cytoscape=path is not None, out_graph=path is not None,
+                                          top=top, max_bytes=max_bytes)
+    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = result
+    return {
+        'formula':            formula,
+        'formula_tcm_links':  formula_tcm_links,
+        'tcm':                tcm,
+        'tcm_chem_links':     tcm_chem_links,
+        'chem':               chem,
+        'chem_protein_links': chem_protein_links,
+        'proteins':           proteins,
+    }
+
+
+def from_tcm_protein(tcms: list[str], proteins: list[str], score: int, path, top: int = None, max_bytes: int = None):
     """
     给定中药和靶点分析
     Args:
         tcms:     中药 id 列表，如 ['HVM0367', 'HVM1695']
         proteins: 靶点 id 列表，如 ['ENSP00000043402', 'ENSP00000223366']
         score:
-        path:
-    Returns:
+        path:     图像输出路径，为 None 时不输出文件
+        top:       Graph.html 中每类节点最多保留的个数，为 None 时保留全部节点
+        max_bytes: Graph.html 的大小上限（字节），为 None 时不限制
+    Returns: 表名 -> DataFrame 的 dict，ID 有误时为 {"msg": 错误信息}
     """
     if not check_id(tcms, check_tcm_id):
-        return json.dumps({'msg': 'Wrong TCM ID'})
+        return {'msg': 'Wrong TCM ID'}
     if not check_id(proteins, check_protein_id):
-        return json.dumps({'msg': 'Wrong protein ID'})
+        return {'msg': 'Wrong protein ID'}
     result = analysis.from_tcm_or_formula(
         tcm_or_formula_id=tcms,
         proteins_id=proteins,
         path=path,
-        score=score
+        score=score,
+        out_for_cytoscape=path is not None,
+        out_graph=path is not None,
+        top=top,
+        max_bytes=max_bytes
     )
-    tmp = []
-    for e in result:
-        tmp.append(nan_converter(e))
-    tcm, tcm_chem_links, chem, chem_protein_links, proteins = tmp
-    return json.dumps({
-        'tcm': tcm.to_dict(orient='records'),
-        'tcm_chem_link': tcm_chem_links.to_dict(orient='records'),
-        'chem': chem.to_dict(orient='records'),
-        'chem_protein_link': chem_protein_links.to_dict(orient='records'),
-        'protein': proteins.to_dict(orient='records')
-    })
-
-
-def from_formula_protein(formulas: list[str], proteins: list[str], score: int, path):
+    tcm, tcm_chem_links, chem, chem_protein_links, proteins = result
+    return {
+        'tcm': tcm,
+        'tcm_chem_link': tcm_chem_links,
+        'chem': chem,
+        'chem_protein_link': chem_protein_links,
+        'protein': proteins
+    }
+
+
+def from_formula_protein(formulas: list[str], proteins: list[str], score: int, path, top: int = None, max_bytes: int = None):
     """
     给定复方和靶点分析
     Args:
         formulas: 复方 id 列表，如 ['HVP1625']
         proteins: 靶点 id 列表，如 ['ENSP00000381588', 'ENSP00000252519']
         score:
-        path:
-    Returns:
+        path:     图像输出路径，为 None 时不输出文件
+        top:       Graph.html 中每类节点最多保留的个数，为 None 时保留全部节点
+        max_bytes: Graph.html 的大小上限（字节），为 None 时不限制
+    Returns: 表名 -> DataFrame 的 dict，ID 有误时为 {"msg": 错误信息}
     """
     if not check_id(formulas, check_formula_id):
-        return json.dumps({'msg': 'Wrong formula ID'})
+        return {'msg': 'Wrong formula ID'}
     if not check_id(proteins, check_protein_id):
-        return json.dumps({'msg': 'Wrong protein ID'})
+        return {'msg': 'Wrong protein ID'}
     result = analysis.from_tcm_or_formula(
         tcm_or_formula_id=formulas,
         proteins_id=proteins,
         path=path,
-        score=score
+        score=score,
+        out_for_cytoscape=path is not None,
+        out_graph=path is not None,
+        top=top,
+        max_bytes=max_bytes
     )
-    tmp = []
-    for e in result:
-        tmp.append(nan_converter(e))
-    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = tmp
-    return json.dumps({
-        'formula':            formula.to_dict(orient='records'),
-        'formula_tcm_links':  formula_tcm_links.to_dict(orient='records'),
-        'tcm':                tcm.to_dict(orient='records'),
-        'tcm_chem_links':     tcm_chem_links.to_dict(orient='records'),
-        'chem':               chem.to_dict(orient='records'),
-        'chem_protein_links': chem_protein_links.to_dict(orient='records'),
-        'proteins':           proteins.to_dict(orient='records'),
-    })
+    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = result
+    return {
+        'formula':            formula,
+        'formula_tcm_links':  formula_tcm_links,
+        'tcm':                tcm,
+        'tcm_chem_links':     tcm_chem_links,
+        'chem':               chem,
+        'chem_protein_links': chem_protein_links,
+        'proteins':           proteins,
+    }
 
 
 def from_protein(proteins: list[str], score: int, path):
@@ -202,57 +269,218 @@ def from_protein(proteins: list[str], score: int, path):
     Args:
         proteins: 靶点 id 列表，如 ['ENSP00000381588', 'ENSP00000252519']
         score:
-        path:
-    Returns:
+        path:     图像输出路径，为 None 时不输出文件
+    Returns: 表名 -> DataFrame 的 dict，ID 有误时为 {"msg": 错误信息}
     """
     if not check_id(proteins, check_protein_id):
-        return json.dumps({'msg': 'Wrong protein ID'})
+        return {'msg': 'Wrong protein ID'}
     # 优化
     result = analysis.from_proteins(
         proteins,
         score=score,
         random_state=138192,
         num=100,
-        path=path
+        path=path,
+        out_for_cytoscape=path is not None
     )
-    tmp = []
-    for e in result:
-        tmp.append(nan_converter(e))
-    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins, tcms, formulas = tmp
-    return json.dumps({
-        'formula':            formula.to_dict(orient='records'),
-        'formula_tcm_links':  formula_tcm_links.to_dict(orient='records'),
-        'tcm':                tcm.to_dict(orient='records'),
-        'tcm_chem_links':     tcm_chem_links.to_dict(orient='records'),
-        'chem':               chem.to_dict(orient='records'),
-        'chem_protein_links': chem_protein_links.to_dict(orient='records'),
-        'proteins':           proteins.to_dict(orient='records'),
-        'tcms':               tcms.to_dict(orient='records'),
-        'formulas':           formulas.to_dict(orient='records')
-    })
+    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins, tcms, formulas = result
+    return {
+        'formula':            formula,
+        'formula_tcm_links':  formula_tcm_links,
+        'tcm':                tcm,
+        'tcm_chem_links':     tcm_chem_links,
+        'chem':               chem,
+        'chem_protein_links': chem_protein_links,
+        'proteins':           proteins,
+        'tcms':               tcms,
+        'formulas':           formulas
+    }
+
+
+def run(function: str, params: dict, write_files: bool = True) -> dict:
+    """
+    执行 function 对应的分析
+    Args:
+        function:    "tcm", "formula", "protein", "tcm_protein" 或 "formula_protein"
+        params:      参数，键为 tcms、formulas、proteins、score、path、top 和 max_bytes
+        write_files: 是否将 cytoscape 文件和 Graph.html 输出到 path；为 False 时忽略 path，不输出文件
+    Returns: 表名 -> DataFrame 的 dict，ID 有误时为 {"msg": 错误信息}
+    """
+    score = int(params.get('score', 990))
+    path = params.get('path', 'result') if write_files else None
+    # 限制 Graph.html 的规模，仅在输出文件时使用
+    graph = {key: None if params.get(key) is None else int(params[key]) for key in ('top', 'max_bytes')}
+    if function == "tcm":
+        return from_tcm(params.get('tcms'), score, path, **graph)
+    elif function == "formula":
+        return from_formula(params.get('formulas'), score, path, **graph)
+    elif function == "tcm_protein":
+        return from_tcm_protein(params.get('tcms'), params.get('proteins'), score, path, **graph)
+    elif function == "formula_protein":
+        return from_formula_protein(params.get('formulas'), params.get('proteins'), score, path, **graph)
+    elif function == "protein":
+        # 优化模型使用全局随机数种子，逆向分析逐个执行以保证结果可复现
+        with _protein_lock:
+            return from_protein(params.get('proteins'), score, path)
+    return {'msg': f'Unknown function {function}'}
+
+
+_protein_lock = threading.Lock()
+
+# 可用的分析功能。Available analysis functions.
+FUNCTIONS = ("tcm", "formula", "protein", "tcm_protein", "formula_protein")
+
+
+def server_classes():
+    """
+    返回 serve 模式使用的请求处理类和 Unix socket 服务器类
+    http.server 仅在 serve 模式下导入，以加快命令行的启动
+    """
+    import socketserver
+    from http.server import BaseHTTPRequestHandler
+
+    class RequestHandler(BaseHTTPRequestHandler):
+        """
+        serve 模式的请求处理：
+        GET  /<function>?tcms=HVM0367,HVM1695&score=990[&prettier=1][&ndjson=1]
+        POST /<function>，请求体为 json，如 {"tcms": ["HVM0367", "HVM1695"], "score": 990}
+        响应为与命令行相同的 json（或 NDJSON），响应头 X-HerbiV-Latency-Ms 为分析耗时
+        服务端不输出 cytoscape 文件和 Graph.html，请求中的 path 被忽略
+        """
+        protocol_version = 'HTTP/1.0'
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: [item for value in values for item in value.split(',')]
+                      for key, values in parse_qs(url.query).items()}
+            for key in ('score', 'prettier', 'ndjson'):
+                if key in params:
+                    params[key] = params[key][-1]
+            self.handle_request(url.path.strip('/'), params)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                params = json.loads(self.rfile.read(length) or b'{}')
+            except json.JSONDecodeError:
+                params = None
+            if not isinstance(params, dict):
+                self.send_json(400, {'msg': 'Request body must be a json object'})
+                return
+            self.handle_request(urlparse(self.path).path.strip('/') or params.get('function', ''), params)
+
+        def handle_request(self, function, params):
+            start = time.perf_counter()
+            try:
+                result = run(function, params, write_files=False)
+                # 未知功能返回 404，ID 有误等输入错误（结果为 {"msg": 错误信息}）返回 400
+                status = 404 if function not in FUNCTIONS else 400 if 'msg' in result else 200
+            except Exception as e:
+                result, status = {'msg': f'{type(e).__name__}: {e}'}, 500
+            elapsed = (time.perf_counter() - start) * 1000
+
+            ndjson = str(params.get('ndjson', '')).lower() in ('1', 'true')
+            prettier = str(params.get('prettier', '')).lower() in ('1', 'true')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/x-ndjson' if ndjson else 'application/json')
+            self.send_header('X-HerbiV-Latency-Ms', f'{elapsed:.1f}')
+            self.end_headers()
+            stream = io.TextIOWrapper(self.wfile, encoding='utf-8', newline='')
+            write_json(result, stream, prettier=prettier, ndjson=ndjson)
+            stream.flush()
+            stream.detach()
+
+            # 记录每个请求的分析耗时和总耗时
+            total = (time.perf_counter() - start) * 1000
+            sys.stderr.write(f'{function or "-"} {status} analysis={elapsed:.1f}ms total={total:.1f}ms\n')
+
+        def send_json(self, status, result):
+            body = json.dumps(result).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def address_string(self):
+            # Unix socket 的客户端地址为空字符串
+            return self.client_address[0] if self.client_address else 'unix'
+
+        def log_message(self, format, *args):
+            pass
+
+    class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+        def server_bind(self):
+            # 供 BaseHTTPRequestHandler 使用的服务器名称和端口
+            socketserver.UnixStreamServer.server_bind(self)
+            self.server_name, self.server_port = 'localhost', 0
+
+    return RequestHandler, ThreadingUnixHTTPServer
+
+
+def serve(host: str = '127.0.0.1', port: int = 8765, socket_path: str = None):
+    """
+    常驻服务模式：预先读取数据集，通过 HTTP 端口或 Unix socket 并发处理分析请求
+    Args:
+        host:        监听的地址
+        port:        监听的端口
+        socket_path: Unix socket 的路径，指定时不监听端口
+    """
+    # 预先读取没有列式存储的数据集，并建立（或打开）各数据集的查找索引和分数阈值索引，首个请求无需等待
+    names = [name for name in dataset.TABLES
+             if dataset.open_store(name) is not None or os.path.exists(dataset.path(name))]
+    dataset.preload([name for name in names if dataset.open_store(name) is None])
+    for name in names:
+        for column in dataset.KEY_COLUMNS:
+            dataset.index(name, column)
+        dataset.threshold_index(name)
+    from http.server import ThreadingHTTPServer
+    RequestHandler, ThreadingUnixHTTPServer = server_classes()
+
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, RequestHandler)
+        address = socket_path
+    else:
+        server = ThreadingHTTPServer((host, port), RequestHandler)
+        address = f'http://{host}:{server.server_port}'
+    sys.stderr.write(f'HerbiV serving on {address}\n')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('--function', "-f", choices=["tcm", "formula", "protein", "tcm_protein", "formula_protein"], required=True, help='Functions')
+    parser.add_argument('--function', "-f", choices=[*FUNCTIONS, "serve"], required=True, help='Functions')
     parser.add_argument('--tcms', nargs="+", type=str, help='TCM ids')
     parser.add_argument('--formulas', nargs="+", type=str, help='Formula ids')
     parser.add_argument('--proteins', nargs="+", type=str, help='Protein ids')
     parser.add_argument('--path', "-p", type=str, help='Graph Output Path', default="result")
+    parser.add_argument('--top', type=int, help='Graph.html 中每类节点最多保留的个数（按 Importance Score）')
+    parser.add_argument('--max-bytes', type=int, help='Graph.html 的大小上限（字节）')
     parser.add_argument('--prettier', action='store_true', help='输出格式化的 json')
+    parser.add_argument('--ndjson', action='store_true', help='以 NDJSON 格式逐行输出记录')
     parser.add_argument('--score', "-s", type=int, default=990, help='分数')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='serve 模式监听的地址')
+    parser.add_argument('--port', type=int, default=8765, help='serve 模式监听的端口')
+    parser.add_argument('--socket', type=str, help='serve 模式监听的 Unix socket 路径')
     args = parser.parse_args()
 
-    if args.function == "tcm":
-        print(from_tcm(args.tcms, args.score, args.path))
-    elif args.function == "formula":
-        print(from_formula(args.formulas, args.score, args.path))
-    elif args.function == "tcm_protein":
-        print(from_tcm_protein(args.tcms, args.proteins, args.score, args.path))
-    elif args.function == "formula_protein":
-        print(from_formula_protein(args.formulas, args.proteins, args.score, args.path))
-    elif args.function == "protein":
-        print(from_protein(args.proteins, args.score, args.path))
+    if args.function == "serve":
+        serve(args.host, args.port, args.socket)
+        return
+
+    result = run(args.function, vars(args))
+    write_json(result, sys.stdout, prettier=args.prettier, ndjson=args.ndjson)
 
 
 if __name__ == '__main__':
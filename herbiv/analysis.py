@@ -1,6 +1,14 @@
+import os
+import time
+import numpy as np
+import pandas as pd
 from herbiv import get
 from herbiv import compute
 from herbiv import output
+from herbiv import dataset
+from herbiv import cache
+from herbiv import graph
+from herbiv.report import stage, rows
 
 
 # TODO: 将文档修改为get中的格式。
@@ -10,7 +18,11 @@ def from_tcm_or_formula(tcm_or_formula_id,
                         out_for_cytoscape=True,
                         out_graph=True,
                         re=True,
-                        path='results'):
+                        path='results',
+                        session=None,
+                        report=None,
+                        top=None,
+                        max_bytes=None):
     """
         进行经典的正向网络药理学分析
 
@@ -23,6 +35,12 @@ def from_tcm_or_formula(tcm_or_formula_id,
             out_graph (bool): 是否输出基于ECharts的html格式的网络可视化图，默认为True。
             re (bool): 是否返回原始分析结果（中药、化合物（中药成分）、蛋白（靶点）及其连接信息）。
             path (str): 存放结果的目录。
+            session (compute.ScoreSession): 打分会话，默认为None。若传入，则复用其中缓存的各蛋白HerbiV Score。
+            report (report.Report): 记录各阶段耗时、内存峰值和行数的对象，或以每个阶段的记录（dict）调用的函数，
+                                    默认为None，即不记录。详见report.Report。
+            top (int | dict): 网络可视化图中仅保留Importance Score最高的前top个中药、化合物和蛋白，详见output.vis。
+                              默认为None，即保留全部节点。
+            max_bytes (int): 网络可视化图（Graph.html）的大小上限（字节），详见output.vis。默认为None，即不限制。
 
 
         Returns:
@@ -51,7 +69,57 @@ def from_tcm_or_formula(tcm_or_formula_id,
             >>> from_tcm_or_formula(['HVP1625'],['ENSP00000381588', 'ENSP00000252519'], score=400)# medium confidence in STITCH
     """
 
-    
+    # 启用结果缓存（cache.enable）时，相同的输入直接从缓存中读取
+    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = _cached(
+        _forward_analysis, {'tcm_or_formula_id': tcm_or_formula_id, 'is_formula': tcm_or_formula_id[0][2] == 'P',
+                            'proteins_id': proteins_id, 'score': score},
+        tcm_or_formula_id, proteins_id, score, session, report, report=report)
+
+    _output(tcm, tcm_chem_links, chem, chem_protein_links, proteins, path, out_for_cytoscape, out_graph, report,
+            top, max_bytes)
+
+    if re:
+        if tcm_or_formula_id[0][2] == 'P':
+            return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
+        else:
+            return tcm, tcm_chem_links, chem, chem_protein_links, proteins
+
+
+def _forward_analysis(tcm_or_formula_id, proteins_id, score, session, report=None):
+    """from_tcm_or_formula中输出结果之前的步骤：获取网络、筛选有效节点及计算Score。"""
+    with stage(report, 'get') as record:
+        network = _forward_network(tcm_or_formula_id, proteins_id, score)
+        record['rows'] = _network_rows(*network)
+
+    return _score_network(*network, score, session, report)
+
+
+def _score_network(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins,
+                   score, session, report, complete=False):
+    """筛选网络中的有效节点并计算Score。complete为True时网络包含与其中各蛋白相连的全部节点（逆向分析）。"""
+
+    # 筛选有效节点
+    with stage(report, 'dfs_filter') as record:
+        formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = dfs_filter(
+            formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins)
+        record['rows'] = _network_rows(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links,
+                                       proteins)
+
+    # 计算Score
+    with stage(report, 'score') as record:
+        if session is None:
+            tcm, chem, formula = compute.score(tcm, tcm_chem_links, chem, chem_protein_links, formula,
+                                               formula_tcm_links)
+        else:
+            tcm, chem, formula = session.score(tcm, tcm_chem_links, chem, chem_protein_links, formula,
+                                               formula_tcm_links, score=score, complete=complete)
+        record['rows'] = rows(formula=formula, tcm=tcm, chem=chem)
+
+    return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
+
+
+def _forward_network(tcm_or_formula_id, proteins_id, score):
+    """获取tcm_or_formula_id中复方/中药的复方-中药-化合物-蛋白网络。"""
 
     if tcm_or_formula_id[0][2] == 'P':  # 判断输入是否为复方的HVPID
         formula = get.get_formula('HVPID', tcm_or_formula_id)  # 获取该复方的信息
@@ -71,23 +139,7 @@ def from_tcm_or_formula(tcm_or_formula_id,
     else:
         proteins = get.get_proteins('Ensembl_ID', proteins_id)
 
-    # 深度优先搜索筛选有效节点
-    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = dfs_filter(
-        formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins)
-
-    tcm, chem, formula = compute.score(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links)
-
-    if out_for_cytoscape:
-        output.out_for_cyto(tcm, tcm_chem_links, chem, chem_protein_links, proteins, path)
-
-    if out_graph:
-        output.vis(tcm, tcm_chem_links, chem, chem_protein_links, proteins, path)
-
-    if re:
-        if tcm_or_formula_id[0][2] == 'P':
-            return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
-        else:
-            return tcm, tcm_chem_links, chem, chem_protein_links, proteins
+    return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
 
 
 def from_proteins(proteins,
@@ -98,7 +150,10 @@ def from_proteins(proteins,
                   formula_component=True,
                   out_for_cytoscape=True,
                   re=True,
-                  path='result'):
+                  path='result',
+                  session=None,
+                  n_jobs=1,
+                  report=None):
     """
         进行逆向网络药理学分析
 
@@ -112,6 +167,11 @@ def from_proteins(proteins,
             out_for_cytoscape (bool): 是否输出用于Cytoscape绘图的文件。
             re (bool): 是否返回原始分析结果。
             path (str): 存放结果的目录。
+            session (compute.ScoreSession): 打分会话，默认为None。若传入，则复用其中缓存的各蛋白HerbiV Score，
+                                            增减靶点后重新分析时仅计算新增蛋白的HerbiV Score。
+            n_jobs (int): 优化模型并行的进程数，默认为1（不并行）。给定random_state和n_jobs时结果可复现。
+            report (report.Report): 记录各阶段耗时、内存峰值和行数的对象，或以每个阶段的记录（dict）调用的函数，
+                                    默认为None，即不记录。详见report.Report。
 
 
         Returns:
@@ -139,41 +199,276 @@ def from_proteins(proteins,
     """
 
 
-    proteins = get.get_proteins('Ensembl_ID', proteins)
-    chem_protein_links = get.get_chem_protein_links('Ensembl_ID', proteins['Ensembl_ID'], score)
+    # 启用结果缓存（cache.enable）时，相同的输入直接从缓存中读取；
+    # 未指定random_state时优化模型的结果是随机的，此时不缓存
+    result = _cached(
+        _reverse_analysis, {'proteins': proteins, 'score': score, 'random_state': random_state, 'num': num,
+                            'tcm_component': tcm_component, 'formula_component': formula_component,
+                            'n_jobs': max(n_jobs, 1)},
+        proteins, score, random_state, num, tcm_component, formula_component, session, n_jobs, report,
+        enabled=random_state is not None or not (tcm_component or formula_component), report=report)
+    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins, tcms, formulas = result
+
+    _output(tcm, tcm_chem_links, chem, chem_protein_links, proteins, path, out_for_cytoscape, False, report)
+
+    if re:
+        return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins, tcms, formulas
+
+
+def _reverse_analysis(proteins, score, random_state, num, tcm_component, formula_component, session, n_jobs,
+                      report=None):
+    """from_proteins中输出结果之前的步骤。"""
+    with stage(report, 'get') as record:
+        formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = _reverse_network(
+            proteins, score)
+        record['rows'] = _network_rows(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links,
+                                       proteins)
 
     # **新增的异常处理代码**
     if chem_protein_links.empty:
         raise ValueError(f"No compound-protein links found based on the set score value (score={score}). Please try lowering the score to obtain more results.")
 
-    chem = get.get_chemicals('HVCID', chem_protein_links['HVCID'])
-    tcm_chem_links = get.get_tcm_chem_links('HVCID', chem['HVCID'])
-    tcm = get.get_tcm('HVMID', tcm_chem_links['HVMID'])
-    formula_tcm_links = get.get_formula_tcm_links('HVMID', tcm['HVMID'])
-    formula = get.get_formula('HVPID', formula_tcm_links['HVPID'])
+    return _from_network(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins,
+                         score, random_state, num, tcm_component, formula_component, session, n_jobs, report)
 
-    # 深度优先搜索筛选有效节点
-    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = dfs_filter(
-        formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins)
 
-    # 计算Score
-    tcm, chem, formula = compute.score(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links)
+def _cached(function, params, *args, enabled=True, report=None):
+    """
+        启用结果缓存时，以function的名称及params为键缓存function(*args)的返回值。
+        从缓存中读取时，读取的耗时作为cache阶段记录在report中。
+    """
+    if not (enabled and cache.enabled()):
+        return function(*args)
 
-    # 调用优化模型
-    tcms = compute.component(tcm.loc[tcm['Importance Score'] != 1.0], random_state, num) if tcm_component else None
-    formulas = compute.component(formula.loc[formula['Importance Score'] != 1.0],
-                                 random_state, num) if formula_component else None
+    cache_key = cache.key(function.__name__, **params)
+    start = time.perf_counter()
+    result = cache.get(cache_key)
+    if result is None:
+        result = function(*args)
+        cache.put(cache_key, result)
+    elif report is not None:
+        report({'stage': 'cache', 'seconds': time.perf_counter() - start, 'peak_bytes': None,
+                'rows': rows(**dict(zip(_TABLES, result)))})
+    return result
+
+
+# 分析结果中各表的名称。Names of the tables in the analysis results.
+_TABLES = ('formula', 'formula_tcm_links', 'tcm', 'tcm_chem_links', 'chem', 'chem_protein_links', 'proteins',
+           'tcms', 'formulas')
+
+
+def _output(tcm, tcm_chem_links, chem, chem_protein_links, proteins, path, out_for_cytoscape, out_graph, report,
+            top=None, max_bytes=None):
+    """输出用于Cytoscape绘图的文件及网络可视化图（top、max_bytes限制图的规模，见output.vis）。"""
+    tables = rows(tcm=tcm, tcm_chem_links=tcm_chem_links, chem=chem, chem_protein_links=chem_protein_links,
+                  proteins=proteins)
 
     if out_for_cytoscape:
-        output.out_for_cyto(tcm, tcm_chem_links, chem, chem_protein_links, proteins, path)
+        with stage(report, 'out_for_cyto') as record:
+            output.out_for_cyto(tcm, tcm_chem_links, chem, chem_protein_links, proteins, path)
+            record['rows'] = tables
 
-    if re:
-        return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins, tcms, formulas
+    if out_graph:
+        with stage(report, 'vis') as record:
+            output.vis(tcm, tcm_chem_links, chem, chem_protein_links, proteins, path, top=top, max_bytes=max_bytes)
+            record['rows'] = tables
+
+
+def _network_rows(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins):
+    """复方-中药-化合物-蛋白网络中各表的行数。"""
+    return rows(**dict(zip(_TABLES, (formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links,
+                                     proteins))))
+
+
+def _reverse_network(proteins, score, tables=None):
+    """
+        获取与proteins相连的复方-中药-化合物-蛋白网络。
+        tables为预先获取的（包含proteins的）更大靶点集合的网络时，直接从中筛选，结果与逐个调用get中的函数相同。
+    """
+    def pick(level, by, items):
+        frame = tables[level]
+        selected = frame.loc[frame[by].isin(items)].copy()
+        selected.index = range(selected.shape[0])
+        return selected
+
+    if tables is None:
+        proteins = get.get_proteins('Ensembl_ID', proteins)
+        chem_protein_links = get.get_chem_protein_links('Ensembl_ID', proteins['Ensembl_ID'], score)
+        chem = get.get_chemicals('HVCID', chem_protein_links['HVCID'])
+        tcm_chem_links = get.get_tcm_chem_links('HVCID', chem['HVCID'])
+        tcm = get.get_tcm('HVMID', tcm_chem_links['HVMID'])
+        formula_tcm_links = get.get_formula_tcm_links('HVMID', tcm['HVMID'])
+        formula = get.get_formula('HVPID', formula_tcm_links['HVPID'])
+    else:
+        proteins = pick(6, 'Ensembl_ID', proteins)
+        chem_protein_links = pick(5, 'Ensembl_ID', proteins['Ensembl_ID'])
+        chem = pick(4, 'HVCID', chem_protein_links['HVCID'])
+        tcm_chem_links = pick(3, 'HVCID', chem['HVCID'])
+        tcm = pick(2, 'HVMID', tcm_chem_links['HVMID'])
+        formula_tcm_links = pick(1, 'HVMID', tcm['HVMID'])
+        formula = pick(0, 'HVPID', formula_tcm_links['HVPID'])
+
+    return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
+
+
+def _from_network(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins,
+                  score, random_state, num, tcm_component, formula_component, session, n_jobs, report=None):
+    """from_proteins中获取网络之后的步骤：筛选有效节点、计算Score及调用优化模型。"""
+    formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins = _score_network(
+        formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins, score, session, report,
+        complete=True)
+
+    # 调用优化模型
+    tcms = formulas = None
+    if tcm_component:
+        with stage(report, 'tcm_component') as record:
+            tcms = compute.component(tcm.loc[tcm['Importance Score'] != 1.0], random_state, num, n_jobs=n_jobs)
+            record['rows'] = rows(tcms=tcms)
+    if formula_component:
+        with stage(report, 'formula_component') as record:
+            formulas = compute.component(formula.loc[formula['Importance Score'] != 1.0],
+                                         random_state, num, n_jobs=n_jobs)
+            record['rows'] = rows(formulas=formulas)
+
+    return formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins, tcms, formulas
+
+
+def batch_from_tcm_or_formula(groups,
+                              proteins_id=None,
+                              score=990,
+                              n_jobs=1,
+                              share=False):
+    """
+        对多组中药/复方批量进行正向网络药理学分析。数据集只读取一次，各组共享已缓存的数据集，
+        每组依次执行get -> dfs_filter -> compute.score，不输出文件；每完成一组即返回该组的结果。
+
+        Args:
+            groups: 由多组中药或复方的ID组成的可迭代对象，每组与from_tcm_or_formula的tcm_or_formula_id相同。
+            proteins_id: 与from_tcm_or_formula相同，对所有组生效。
+            score (int): 与from_tcm_or_formula相同，默认为990。
+            n_jobs (int): 并行的进程数，默认为1（在当前进程中逐组计算）。
+            share (bool): n_jobs大于1时是否通过dataset.shared使各子进程以只读内存映射的方式共用同一份数据集
+            （没有列式存储的数据集写入临时的列式存储，结束后删除），默认为False，即子进程由当前进程派生时继承已缓存的数据集。
+
+        Returns:
+            generator: 每完成一组即产出(组的序号, 该组from_tcm_or_formula的返回值)，并行时按完成的先后顺序产出。
+
+        Examples:
+            >>> for i, (tcm, tcm_chem_links, chem, chem_protein_links, proteins) in batch_from_tcm_or_formula(
+            ...         [['HVM0367'], ['HVM1695']], n_jobs=2):
+            ...     print(i, tcm.shape)
+    """
+
+    return _stream(_forward, [(group, proteins_id, score) for group in groups], n_jobs, share)
+
+
+def batch_from_proteins(target_sets,
+                        score=0,
+                        random_state=None,
+                        num=1000,
+                        tcm_component=True,
+                        formula_component=True,
+                        session=None,
+                        n_jobs=1,
+                        report=None):
+    """
+        对多组靶点批量进行逆向网络药理学分析。各组共享同一个compute.ScoreSession：
+        全部靶点的HerbiV Score列在开始时一次性计算，多组共有的靶点只计算一次，
+        各组的Importance Score由缓存的列加权得到。进度条中显示每组的耗时及每秒完成的组数。
+        某组靶点没有满足score的化合物-靶点连接时不中断批量分析，该组产出None。
+
+        Args:
+            target_sets: 由多组靶点的Ensembl_ID组成的可迭代对象，每组与from_proteins的proteins相同。
+            score, random_state, num, tcm_component, formula_component, n_jobs: 与from_proteins相同，对所有组生效。
+            session (compute.ScoreSession): 打分会话，默认为None，即新建一个会话。
+            report: report.Report或任意可调用对象，默认为None。每完成一组即记录一条名为target_set的记录，
+            依次对应各组，包含该组的耗时、内存峰值和结果中各表的行数（该组产出None时rows为空），可据此统计每组的吞吐量。
+
+        Returns:
+            generator: 每完成一组即产出(组的序号, 该组from_proteins的返回值)，该组没有化合物-靶点连接时为(组的序号, None)。
+
+        Examples:
+            >>> r = report.Report(memory=False)
+            >>> for i, result in batch_from_proteins([['ENSP00000381588'], ['ENSP00000381588', 'ENSP00000252519']],
+            ...                                      tcm_component=False, formula_component=False, report=r):
+            ...     print(i, None if result is None else result[2].shape)
+            >>> r.to_frame()['seconds']
+    """
+
+    from tqdm import tqdm
+
+    target_sets = [list(proteins) for proteins in target_sets]
+    session = compute.ScoreSession() if session is None else session
+
+    # 一次性获取全部靶点的网络并计算其HerbiV Score列，各组的网络从中筛选
+    union = pd.unique(np.asarray([protein for proteins in target_sets for protein in proteins], dtype=object))
+    tables = _reverse_network(union, score)
+    session.add(tables[6]['Ensembl_ID'], score)
+
+    progress = tqdm(target_sets, unit='set')
+    for i, proteins in enumerate(progress):
+        start = time.perf_counter()
+        with stage(report, 'target_set') as record:
+            network = _reverse_network(proteins, score, tables)
+            # 没有化合物-靶点连接的组产出None，其余组继续分析
+            result = None if network[5].empty else _from_network(
+                *network, score, random_state, num, tcm_component, formula_component, session, n_jobs)
+            record['rows'] = {} if result is None else rows(**dict(zip(_TABLES, result)))
+        progress.set_postfix(seconds=f'{time.perf_counter() - start:.3f}', proteins=len(proteins))
+        yield i, result
+
+
+def _forward(group, proteins_id, score):
+    """batch_from_tcm_or_formula中单组的分析。"""
+    return from_tcm_or_formula(group, proteins_id, score, out_for_cytoscape=False, out_graph=False, re=True)
+
+
+def _stream(function, tasks, n_jobs=1, share=False):
+    """
+        依次（n_jobs大于1时在进程池中）对tasks中的各组参数调用function，每完成一组即产出(序号, 返回值)。
+        数据集在分发任务前预先读取，子进程由当前进程派生时直接共享已缓存的数据集；
+        share为True时改为在dataset.shared中运行进程池，各子进程以只读内存映射的方式共用同一份数据集，结束后恢复原状；
+        进程池中同时等待的任务不超过2 * n_jobs个，以免结果在内存中堆积。
+    """
+    if n_jobs <= 1 or not share:
+        _warm()
+    if n_jobs <= 1:
+        for i, args in enumerate(tasks):
+            yield i, function(*args)
+        return
+
+    from contextlib import ExitStack
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+    with ExitStack() as stack:
+        if share:
+            stack.enter_context(dataset.shared())
+        executor = stack.enter_context(ProcessPoolExecutor(max_workers=n_jobs, initializer=_warm))
+        pending = {}
+        tasks = iter(enumerate(tasks))
+        for i, args in tasks:
+            pending[executor.submit(function, *args)] = i
+            if len(pending) < 2 * n_jobs:
+                continue
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+
+
+def _warm():
+    """预先读取没有列式存储的数据集；有列式存储的数据集按需内存映射，无需预先读取；数据集目录中不存在的数据集被跳过。"""
+    dataset.preload([name for name in dataset.TABLES
+                     if dataset.open_store(name) is None and os.path.exists(dataset.path(name))])
 
 
 def dfs_filter(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins):
     """
-        深度优先搜索筛选有效节点（在完整的（复方-）中药-化合物-蛋白通路中的节点）
+        筛选有效节点（在完整的（复方-）中药-化合物-蛋白通路中的节点）。
+        结果与深度优先搜索相同，但将连接信息建为graph.HerbGraph后以整数编码逐层扩展（CSR数组切片）实现，耗时与连接数成线性关系。
 
         Args:
             formula: 复方信息。
@@ -205,33 +500,37 @@ def dfs_filter(formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_prote
     """
 
 
-    formula_id = set()
-    tcm_id = set()
-    chem_id = set()
-    proteins_id = set()
-
-    # 深度优先搜索得到有效节点的ID
-    for f in formula['HVPID'] if (formula_tcm_links is not None) else [0]:
-        for m in tcm['HVMID'] if (formula_tcm_links is None) else set(formula_tcm_links.loc[
-                                                                        formula_tcm_links['HVPID'] == f]['HVMID']):
-            for c in set(tcm_chem_links.loc[tcm_chem_links['HVMID'] == m]['HVCID']):
-                for p in set(chem_protein_links.loc[chem_protein_links['HVCID'] == c]['Ensembl_ID']):
-                    if p in proteins['Ensembl_ID'].tolist():
-                        formula_id.add(f)
-                        tcm_id.add(m)
-                        chem_id.add(c)
-                        proteins_id.add(p)
-
-    # 根据有效节点的ID更新formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
-    formula = None if formula is None else formula.loc[formula['HVPID'].isin(formula_id)]
-    tcm = tcm.loc[tcm['HVMID'].isin(tcm_id)]
-    chem = chem.loc[chem['HVCID'].isin(chem_id)]
-    proteins = proteins.loc[proteins['Ensembl_ID'].isin(proteins_id)]
-    formula_tcm_links = None if formula_tcm_links is None else formula_tcm_links.loc[
-        formula_tcm_links['HVPID'].isin(formula_id) & formula_tcm_links['HVMID'].isin(tcm_id)]
-    tcm_chem_links = tcm_chem_links.loc[tcm_chem_links['HVMID'].isin(tcm_id) & tcm_chem_links['HVCID'].isin(chem_id)]
-    chem_protein_links = chem_protein_links.loc[chem_protein_links['HVCID'].isin(chem_id) &
-                                                chem_protein_links['Ensembl_ID'].isin(proteins_id)]
+    # 以与拟分析蛋白相连的化合物-蛋白连接及其余连接信息建立整数编码图
+    protein_links = chem_protein_links.loc[chem_protein_links['Ensembl_ID'].isin(proteins['Ensembl_ID'])]
+    g = graph.HerbGraph(formula_tcm_links, tcm_chem_links, protein_links)
+
+    # 搜索的起点中药：传入复方时为复方所含的中药，否则为tcm中的中药
+    if formula_tcm_links is None:
+        start_tcm = g.encode('tcm', tcm['HVMID'])
+    else:
+        formula_codes = g.encode('formula', formula['HVPID'])
+        start_tcm = g.expand('formula_tcm', formula_codes)
+
+    # 起点中药的中药-化合物连接中，化合物与拟分析蛋白相连（在protein_links中有连接）的连接给出有效的中药和化合物
+    tcm_src, chem_dst = g.edges('tcm_chem', start_tcm)
+    valid = g.degree('chem_protein')[chem_dst] > 0
+    tcm_codes, chem_codes = np.unique(tcm_src[valid]), np.unique(chem_dst[valid])
+    protein_codes = g.expand('chem_protein', chem_codes)
+
+    # 有效的复方：含有有效中药的复方
+    if formula_tcm_links is not None:
+        formula_src, tcm_dst = g.edges('formula_tcm', formula_codes)
+        formula_codes = np.unique(formula_src[np.isin(tcm_dst, tcm_codes)])
+
+    # 根据有效节点更新formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, proteins
+    formula = None if formula is None else formula.loc[formula['HVPID'].isin(g.decode('formula', formula_codes))]
+    tcm = tcm.loc[tcm['HVMID'].isin(g.decode('tcm', tcm_codes))]
+    chem = chem.loc[chem['HVCID'].isin(g.decode('chem', chem_codes))]
+    proteins = proteins.loc[proteins['Ensembl_ID'].isin(g.decode('protein', protein_codes))]
+    formula_tcm_links = None if formula_tcm_links is None else \
+        formula_tcm_links.loc[g.mask('formula_tcm', formula_codes, tcm_codes)]
+    tcm_chem_links = tcm_chem_links.loc[g.mask('tcm_chem', tcm_codes, chem_codes)]
+    chem_protein_links = protein_links.loc[g.mask('chem_protein', chem_codes, protein_codes)]
 
     # 重新编号（chem、tcm和formula在计算score时会重新编号，此处不再重新编号）
     tcm_chem_links.index = range(tcm_chem_links.shape[0])
@@ -0,0 +1,202 @@
+import os
+import pickle
+import hashlib
+import threading
+from herbiv import dataset
+
+# 结果缓存目录，可通过环境变量HERBIV_RESULT_CACHE设置，默认为None，即不缓存分析结果。
+# Directory of the result cache, which can be set by the environment variable HERBIV_RESULT_CACHE.
+# None by default, i.e. analysis results are not cached.
+_directory = os.environ.get('HERBIV_RESULT_CACHE') or None
+
+# 结果缓存的磁盘上限（字节），可通过环境变量HERBIV_RESULT_CACHE_MB（单位为MB）设置，默认为1024 MB。
+# Disk budget of the result cache in bytes, which can be set by the environment variable HERBIV_RESULT_CACHE_MB (in MB).
+_limit = int(float(os.environ.get('HERBIV_RESULT_CACHE_MB', 1024)) * 1024 * 1024)
+
+# 命中、未命中、写入及淘汰的次数。Numbers of hits, misses, writes and evictions.
+_stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+_lock = threading.Lock()
+
+# 缓存文件的扩展名。Extension of the cache files.
+SUFFIX = '.pkl'
+
+
+def enable(directory, max_mb=None):
+    """
+        启用分析结果的磁盘缓存。相同的输入（ID、蛋白、score、random_state、num等）和相同版本的数据集再次分析时，
+        直接从缓存中读取结果。
+        Enable the on-disk cache of analysis results. An analysis repeated with the same inputs
+        (IDs, proteins, score, random_state, num, etc.) on the same version of the datasets
+        reads its results directly from the cache.
+
+        Args:
+            directory (str): 缓存目录，不存在时自动创建。Cache directory, created if it does not exist.
+            max_mb (float): 缓存的磁盘上限（MB），超出上限时按LRU顺序淘汰，默认为None，即保持当前设置。
+            Disk budget of the cache in MB, entries are evicted in LRU order when it is exceeded,
+            None by default, i.e. the current setting is kept.
+
+        Examples:
+            >>> enable('herbiv_cache', max_mb=512)
+            >>> analysis.from_tcm_or_formula(['HVP1625'], score=990)  # 计算并写入缓存
+            >>> analysis.from_tcm_or_formula(['HVP1625'], score=990)  # 从缓存中读取
+            >>> info()['hits']
+            1
+    """
+    global _directory, _limit
+    os.makedirs(directory, exist_ok=True)
+    _directory = directory
+    if max_mb is not None:
+        _limit = int(max_mb * 1024 * 1024)
+        _evict()
+
+
+def disable():
+    """
+        停用分析结果的磁盘缓存（已缓存的文件保留在磁盘上）。
+        Disable the on-disk cache of analysis results (files already cached are kept on disk).
+    """
+    global _directory
+    _directory = None
+
+
+def enabled() -> bool:
+    """返回是否已启用结果缓存。Return whether the result cache is enabled."""
+    return _directory is not None
+
+
+def key(function, **params) -> str:
+    """
+        返回分析function在参数params下的缓存键。参数中的ID集合被去重并排序，键中还包含数据集的版本。
+        Return the cache key of the analysis function with the parameters params.
+        Collections of IDs in the parameters are deduplicated and sorted, and the version of the datasets
+        is included in the key.
+
+        Args:
+            function (str): 分析函数的名称。Name of the analysis function.
+            **params: 影响分析结果的参数。Parameters that affect the analysis results.
+
+        Returns:
+            str: 缓存键（十六进制摘要）。Cache key (hexadecimal digest).
+    """
+    def normalise(value):
+        if isinstance(value, dict):
+            return sorted((str(k), normalise(v)) for k, v in value.items())
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return value
+        return sorted({str(item) for item in value})
+
+    params = sorted((name, normalise(value)) for name, value in params.items())
+    return hashlib.sha1(repr((function, params, dataset.version())).encode('utf-8')).hexdigest()
+
+
+def get(cache_key):
+    """
+        读取缓存键cache_key对应的结果，未启用缓存或未命中时返回None。
+        Read the result of the cache key cache_key; None is returned if the cache is disabled or missed.
+    """
+    if _directory is None:
+        return None
+
+    file = os.path.join(_directory, cache_key + SUFFIX)
+    try:
+        with open(file, 'rb') as f:
+            value = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        with _lock:
+            _stats['misses'] += 1
+        return None
+
+    # 更新修改时间，用于LRU淘汰
+    try:
+        os.utime(file)
+    except OSError:
+        pass
+    with _lock:
+        _stats['hits'] += 1
+    return value
+
+
+def put(cache_key, value):
+    """
+        将结果value写入缓存键cache_key，超出磁盘上限时按LRU顺序淘汰最久未使用的结果。
+        Write the result value under the cache key cache_key. The least recently used results are evicted
+        when the disk budget is exceeded.
+    """
+    if _directory is None:
+        return
+
+    # 先写入临时文件再替换，避免并发读取到不完整的文件
+    os.makedirs(_directory, exist_ok=True)
+    file = os.path.join(_directory, cache_key + SUFFIX)
+    tmp = f'{file}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, file)
+    with _lock:
+        _stats['writes'] += 1
+    _evict()
+
+
+def _entries():
+    """返回缓存目录中的(修改时间, 大小, 路径)，按修改时间升序排列。"""
+    entries = []
+    if not os.path.isdir(_directory):
+        return entries
+    for entry in os.scandir(_directory):
+        if entry.name.endswith(SUFFIX):
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+    return sorted(entries)
+
+
+def _evict():
+    """按LRU顺序淘汰结果，直至缓存不超过磁盘上限。"""
+    if _directory is None:
+        return
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    for _, size, file in entries:
+        if total <= _limit:
+            break
+        try:
+            os.remove(file)
+        except OSError:
+            continue
+        total -= size
+        with _lock:
+            _stats['evictions'] += 1
+
+
+def clear():
+    """
+        删除缓存目录中的全部结果并重置统计。
+        Delete all results in the cache directory and reset the statistics.
+    """
+    if _directory is not None:
+        for _, _, file in _entries():
+            try:
+                os.remove(file)
+            except OSError:
+                pass
+    with _lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def info() -> dict:
+    """
+        返回结果缓存的状态。
+        Return the state of the result cache.
+
+        Returns:
+            dict: 缓存目录、命中/未命中/写入/淘汰次数、缓存的结果数、占用的磁盘空间和磁盘上限。
+            Cache directory, numbers of hits/misses/writes/evictions, number of cached results,
+            disk usage and disk budget.
+    """
+    entries = _entries() if _directory is not None else []
+    with _lock:
+        return {'directory': _directory, **_stats, 'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries), 'limit': _limit}
@@ -3,7 +3,7 @@ import pandas as pd
 from typing import Union
 from math import ceil
 import random
-from tqdm import tqdm
+from herbiv import get
 
 
 def score(tcm: pd.DataFrame,
@@ -98,31 +98,187 @@ def score(tcm: pd.DataFrame,
 
     proteins_id = chem_protein_links['Ensembl_ID'].unique()
 
-    # 计算与各蛋白对应的HerbiV Score
-    for protein in proteins_id:
-
-        # 计算每一个化合物的HerbiV Score
-        chem_and_score[protein + ' HerbiV Score'] = chem.loc[:, 'HVCID'].apply(lambda x: 1 - (1 - np.array(
-            [*chem_protein_links.loc[(chem_protein_links['HVCID'] == x) &
-                                     (chem_protein_links['Ensembl_ID'] == protein)]['Combined_score']])
-                                                                                              ).prod()
-                                                                               )
-
-        # 计算各中药的HerbiV Score
-        tcm_and_score[protein + ' HerbiV Score'] = tcm.loc[:, 'HVMID'].apply(lambda x: 1 - (1 - np.array(
-            [*chem_and_score.loc[chem_and_score['HVCID'].isin(
-                tcm_chem_links.loc[tcm_chem_links['HVMID'] == x]['HVCID'])][protein + ' HerbiV Score']])
-                                                                                            ).prod()
-                                                                             )
-
-        # 若传入了复方相关信息，则还需计算各复方的HerbiV Score
-        if formula is not None:
-            formula_and_score[protein + ' HerbiV Score'] = formula.loc[:, 'HVPID'].apply(lambda x: 1 - (1 - np.array(
-                [*tcm_and_score.loc[tcm_and_score['HVMID'].isin(
-                    formula_tcm_links.loc[formula_tcm_links['HVPID'] == x]['HVMID'])][protein + ' HerbiV Score']])
-                                                                                                        ).prod()
-                                                                                         )
+    # 一次性计算所有蛋白对应的HerbiV Score
+    chem_scores, tcm_scores, formula_scores = _score_matrices(
+        proteins_id, tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links)
 
+    columns = [protein + ' HerbiV Score' for protein in proteins_id]
+    chem_and_score = _assign(chem_and_score, columns, chem_scores)
+    tcm_and_score = _assign(tcm_and_score, columns, tcm_scores)
+    if formula is not None:
+        formula_and_score = _assign(formula_and_score, columns, formula_scores)
+
+    return _importance(tcm_and_score, chem_and_score, formula_and_score, proteins_id, weights)
+
+
+class ScoreSession:
+    """
+        缓存各蛋白HerbiV Score列的打分会话，用于靶点集合逐步变化的交互式分析。
+
+        每个蛋白（在给定的score阈值下）对化合物、中药和复方的HerbiV Score只取决于该蛋白本身，
+        因此各列计算一次后即缓存（仅保存非零值）。score只在传入的网络上计算尚未缓存的蛋白的列，计算量与compute.score相同；
+        缓存的列记录了计算时覆盖的化合物、中药和复方，仅在覆盖了新网络时复用，否则在新网络上重新计算。
+        add以及逆向分析（complete=True）基于与蛋白相连的全部化合物、中药和复方计算，得到的列可用于任何网络。
+        新增靶点时只计算新蛋白的列，移除靶点时其列不再参与计算，Importance Score由缓存的列重新加权得到。
+        数据集发生变化后应创建新的会话。
+
+        Examples:
+            >>> session = ScoreSession()
+            >>> analysis.from_proteins(['ENSP00000381588'], session=session)
+            >>> # 仅计算ENSP00000252519的HerbiV Score
+            >>> analysis.from_proteins(['ENSP00000381588', 'ENSP00000252519'], session=session)
+    """
+
+    def __init__(self):
+        # (蛋白, score) -> (块, 列号)。块为一次计算得到的(覆盖范围, 各层的非零值, 列数)：
+        # 覆盖范围为计算时各层的ID（pd.Index），None表示基于与蛋白相连的全部节点计算；
+        # 各层的非零值为(ID, 列号, HerbiV Score)数组，未计算复方时该层为None
+        self._columns = {}
+
+    @property
+    def proteins(self) -> list:
+        """已缓存的(蛋白, score)。"""
+        return list(self._columns)
+
+    def add(self, proteins, score=0):
+        """
+            基于完整的数据集计算并缓存proteins中尚未缓存（或仅在部分网络上缓存）的蛋白的HerbiV Score列。
+
+            Args:
+                proteins: 任何可以使用in判断一个元素是否在其中的组合数据类型，蛋白（靶点）的Ensembl_ID。
+                score (int): HerbiV_chemical_protein_links数据集中仅combined_score大于等于score的记录会被使用。
+        """
+        missing = [protein for protein in pd.unique(np.asarray(list(proteins), dtype=object))
+                   if (protein, score) not in self._columns or self._columns[(protein, score)][0][0] is not None]
+        if not missing:
+            return
+
+        # 仅取出与新蛋白相关的子网络
+        chem_protein_links = get.get_chem_protein_links('Ensembl_ID', missing, score)
+        chem = pd.DataFrame({'HVCID': chem_protein_links['HVCID'].unique()})
+        tcm_chem_links = get.get_tcm_chem_links('HVCID', chem['HVCID'])
+        tcm = pd.DataFrame({'HVMID': tcm_chem_links['HVMID'].unique()})
+        formula_tcm_links = get.get_formula_tcm_links('HVMID', tcm['HVMID'])
+        formula = pd.DataFrame({'HVPID': formula_tcm_links['HVPID'].unique()})
+
+        scores = _score_matrices(missing, tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links)
+        ids = (chem['HVCID'].to_numpy(), tcm['HVMID'].to_numpy(), formula['HVPID'].to_numpy())
+        self._store(missing, score, scores, ids, None)
+
+    def discard(self, proteins=None, score=None):
+        """
+            从缓存中移除proteins（默认为全部蛋白）在score（默认为全部阈值）下的HerbiV Score列。
+        """
+        for protein, s in list(self._columns):
+            if (proteins is None or protein in proteins) and (score is None or s == score):
+                del self._columns[(protein, s)]
+
+    def score(self,
+              tcm: pd.DataFrame,
+              tcm_chem_links: pd.DataFrame,
+              chem: pd.DataFrame,
+              chem_protein_links: pd.DataFrame,
+              formula: Union[pd.DataFrame, None] = None,
+              formula_tcm_links: Union[pd.DataFrame, None] = None,
+              weights: Union[dict, None] = None,
+              score: int = 0,
+              complete: bool = False) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+        """
+            与compute.score相同，但各蛋白的HerbiV Score列取自缓存，仅在传入的网络上计算尚未缓存的蛋白。
+
+            Args:
+                tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links, weights:
+                与compute.score相同。
+                score (int): 获取chem_protein_links时使用的combined_score阈值，用于区分缓存。
+                complete (bool): 网络是否包含与其中各蛋白相连的全部化合物、中药和复方（如逆向分析获取的网络），默认为False。
+                若为True，则计算的列可用于任何网络。
+
+            Returns:
+                与compute.score相同。
+        """
+        proteins_id = chem_protein_links['Ensembl_ID'].unique()
+        frames = ((chem, 'HVCID'), (tcm, 'HVMID'), (formula, 'HVPID'))
+        # 各层不重复的ID（与pd.unique的顺序相同）及其首次出现的行
+        firsts = [None if frame is None else ~frame[by].duplicated().to_numpy() for frame, by in frames]
+        ids = [None if frame is None else pd.Index(frame[by].to_numpy()[first])
+               for (frame, by), first in zip(frames, firsts)]
+
+        missing = self._missing(proteins_id, score, ids)
+        if missing:
+            matrices = _score_matrices(missing, tcm, tcm_chem_links, chem, chem_protein_links, formula,
+                                       formula_tcm_links)
+            self._store(missing, score,
+                        [None if values is None else values[first] for values, first in zip(matrices, firsts)],
+                        [None if index is None else index.to_numpy() for index in ids],
+                        None if complete and formula is not None else tuple(ids))
+        # 全部列均在本网络上计算时直接使用计算结果，否则将缓存的非零值按ID散布到frame的各行
+        if not missing or len(missing) < len(proteins_id):
+            matrices = [None if frame is None else
+                        self._gather(proteins_id, score, level, index)[index.get_indexer(frame[by].to_numpy())]
+                        for level, ((frame, by), index) in enumerate(zip(frames, ids))]
+
+        columns = [protein + ' HerbiV Score' for protein in proteins_id]
+        chem_and_score, tcm_and_score, formula_and_score = (
+            None if frame is None else _assign(frame.copy(), columns, values)
+            for (frame, _), values in zip(frames, matrices))
+        return _importance(tcm_and_score, chem_and_score, formula_and_score, proteins_id, weights)
+
+    def _missing(self, proteins_id, score, ids):
+        """proteins_id中尚未缓存或缓存的列未覆盖ids（各层的ID）的蛋白。"""
+        covered = {}
+        missing = []
+        for protein in proteins_id:
+            if (protein, score) not in self._columns:
+                missing.append(protein)
+                continue
+            block = self._columns[(protein, score)][0]
+            if block[0] is None:
+                continue
+            # 同一块中的列覆盖范围相同，每个块只检查一次
+            if id(block) not in covered:
+                covered[id(block)] = all(index is None or (known is not None and index.isin(known).all())
+                                         for index, known in zip(ids, block[0]))
+            if not covered[id(block)]:
+                missing.append(protein)
+        return missing
+
+    def _store(self, proteins, score, matrices, ids, coverage):
+        """将一次计算得到的各层HerbiV Score矩阵（行与ids对应，列与proteins对应）的非零值作为一个块存入缓存。"""
+        levels = []
+        for values, index in zip(matrices, ids):
+            if values is None:
+                levels.append(None)
+                continue
+            rows, cols = np.nonzero(values)
+            levels.append((index[rows], cols, values[rows, cols]))
+        block = (coverage, tuple(levels), len(proteins))
+        for j, protein in enumerate(proteins):
+            self._columns[(protein, score)] = (block, j)
+
+    def _gather(self, proteins_id, score, level, index):
+        """由缓存中proteins_id各列在level层的非零值构造行与index对应的HerbiV Score矩阵。"""
+        values = np.zeros((len(index), len(proteins_id)))
+        blocks = {}
+        for j, protein in enumerate(proteins_id):
+            block, col = self._columns[(protein, score)]
+            blocks.setdefault(id(block), (block, [], []))
+            blocks[id(block)][1].append(col)
+            blocks[id(block)][2].append(j)
+        for block, cols, positions in blocks.values():
+            entry_ids, entry_cols, entry_values = block[1][level]
+            # 块中各列在结果中的位置，不需要的列为-1
+            lookup = np.full(block[2], -1)
+            lookup[cols] = positions
+            out = lookup[entry_cols]
+            keep = out >= 0
+            rows = index.get_indexer(entry_ids[keep])
+            found = rows >= 0
+            values[rows[found], out[keep][found]] = entry_values[keep][found]
+        return values
+
+
+def _importance(tcm_and_score, chem_and_score, formula_and_score, proteins_id, weights=None):
+    """根据各蛋白的HerbiV Score列加权计算Importance Score，并按其降序排序。"""
     # TODO: 验证各权重的和是否为靶点（蛋白）的总数或和为1。若权重为小数，则需要据此计算权重。
     # 若使用默认权重，则权重默认均为1
     if weights is None:
@@ -130,19 +286,19 @@ def score(tcm: pd.DataFrame,
 
     # TODO: 将所有Importance Score替换为HerbiV Score
     # 加权计算各复方、中药、成分（化合物）的HerbiV Score
-    if formula is not None:
+    if formula_and_score is not None:
         formula_and_score['Importance Score'] = (formula_and_score[list(weights.keys())] * pd.Series(weights)).mean(axis=1)
     tcm_and_score['Importance Score'] = (tcm_and_score[list(weights.keys())] * pd.Series(weights)).mean(axis=1)
     chem_and_score['Importance Score'] = (chem_and_score[list(weights.keys())] * pd.Series(weights)).mean(axis=1)
 
     # 根据Importance Score降序排序
-    if formula is not None:
+    if formula_and_score is not None:
         formula_and_score = formula_and_score.sort_values(by='Importance Score', ascending=False)
     tcm_and_score = tcm_and_score.sort_values(by='Importance Score', ascending=False)
     chem_and_score = chem_and_score.sort_values(by='Importance Score', ascending=False)
 
     # 重新设置索引
-    if formula is not None:
+    if formula_and_score is not None:
         formula_and_score.index = range(formula_and_score.shape[0])
     tcm_and_score.index = range(tcm_and_score.shape[0])
     chem_and_score.index = range(chem_and_score.shape[0])
@@ -150,13 +306,133 @@ def score(tcm: pd.DataFrame,
     return tcm_and_score, chem_and_score, formula_and_score
 
 
-def component(items_and_score, random_state=None, num=1000, c=10):
+def _assign(frame, columns, values):
+    """将values（二维数组）作为columns列一次性加入frame，同名的已有列被替换。"""
+    frame = frame.drop(columns=[col for col in columns if col in frame.columns])
+    return pd.concat([frame, pd.DataFrame(values, columns=columns, index=frame.index)], axis=1)
+
+
+def _group_log_sum(groups, members, log_values, n_groups, block=256):
+    """
+        按groups对log_values中members对应的行分组求和，返回n_groups行的矩阵。
+        按列分块计算，以限制大量蛋白时的临时内存。
+    """
+    out = np.zeros((n_groups, log_values.shape[1]))
+    if groups.shape[0] == 0:
+        return out
+
+    order = np.argsort(groups, kind='stable')
+    groups, members = groups[order], members[order]
+    starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1])))
+    for j in range(0, log_values.shape[1], block):
+        out[groups[starts], j:j + block] = np.add.reduceat(log_values[members, j:j + block], starts, axis=0)
+    return out
+
+
+def _score_matrices(proteins_id, tcm, tcm_chem_links, chem, chem_protein_links, formula=None, formula_tcm_links=None):
+    """
+        向量化计算化合物、中药和复方对proteins_id中各蛋白的HerbiV Score。
+
+        HerbiV Score为1 - prod(1 - p)，在对数空间中计算：log(1 - score) = sum(log(1 - p))，
+        各层先按ID求和，再通过连接信息分组求和传递到上一层。
+
+        Returns:
+            与chem、tcm、formula各行对应的HerbiV Score矩阵（列与proteins_id对应），未传入formula时最后一项为None。
+    """
+    n_proteins = len(proteins_id)
+
+    # 化合物层：按(化合物, 蛋白)对log(1 - Combined_score)求和
+    chem_ids = pd.Index(pd.unique(chem['HVCID']))
+    link_chem = chem_ids.get_indexer(chem_protein_links['HVCID'])
+    link_protein = pd.Index(proteins_id).get_indexer(chem_protein_links['Ensembl_ID'])
+    valid = (link_chem >= 0) & (link_protein >= 0)
+    with np.errstate(divide='ignore'):
+        link_log = np.log1p(-chem_protein_links['Combined_score'].to_numpy(dtype=float)[valid])
+    chem_log = np.zeros((len(chem_ids), n_proteins))
+    np.add.at(chem_log, (link_chem[valid], link_protein[valid]), link_log)
+
+    # 中药层：同一中药的成分只计一次，但与成分ID相同的每一行化合物都参与计算
+    chem_rows = chem_ids.get_indexer(chem['HVCID'])
+    chem_log_rows = chem_log * np.bincount(chem_rows, minlength=len(chem_ids))[:, None]
+    tcm_ids = pd.Index(pd.unique(tcm['HVMID']))
+    tcm_log = _pair_log_sum(tcm_chem_links, 'HVMID', 'HVCID', tcm_ids, chem_ids, chem_log_rows)
+
+    # 以0.0减去，使没有连接的节点得到0.0而非-0.0
+    chem_scores = 0.0 - np.expm1(chem_log[chem_rows])
+    tcm_rows = tcm_ids.get_indexer(tcm['HVMID'])
+    tcm_scores = 0.0 - np.expm1(tcm_log[tcm_rows])
+
+    # 复方层
+    formula_scores = None
+    if formula is not None:
+        tcm_log_rows = tcm_log * np.bincount(tcm_rows, minlength=len(tcm_ids))[:, None]
+        formula_ids = pd.Index(pd.unique(formula['HVPID']))
+        formula_log = _pair_log_sum(formula_tcm_links, 'HVPID', 'HVMID', formula_ids, tcm_ids, tcm_log_rows)
+        formula_scores = 0.0 - np.expm1(formula_log[formula_ids.get_indexer(formula['HVPID'])])
+
+    return chem_scores, tcm_scores, formula_scores
+
+
+def _pair_log_sum(links, by, member, by_ids, member_ids, member_log):
+    """对links中去重后的(by, member)连接，按by分组对member_log求和。"""
+    pairs = links[[by, member]].drop_duplicates()
+    groups = by_ids.get_indexer(pairs[by])
+    members = member_ids.get_indexer(pairs[member])
+    valid = (groups >= 0) & (members >= 0)
+    return _group_log_sum(groups[valid], members[valid], member_log, len(by_ids))
+
+
+class SolutionIndex:
+    """
+        已得出的解的哈希索引，用于在knapsack中排除之前的解。
+        记录每个中药/复方与哪些中药/复方出现在同一个解中，检查冲突时只需查询当前候选的中药/复方，
+        耗时与已得出的解的数量无关。
+        Hashed index of the solutions found so far, used by knapsack to rule out earlier solutions.
+        It records which TCM/formulas appear in the same solution as each TCM/formula, so that a conflict check
+        only looks up the current candidates and costs the same no matter how many solutions exist.
+
+        Args:
+            combinations (collections.abc.Iterable): 初始的禁止组合，默认为空。Initial forbidden combinations.
+
+        Attributes:
+            rejected (int): 因与之前的解冲突而被放弃的候选数。Number of candidates rejected for repeating earlier solutions.
+    """
+
+    def __init__(self, combinations=()):
+        # 中药/复方 -> 与其出现在同一个解中的中药/复方（包括其自身）
+        self._partners = {}
+        self.rejected = 0
+        for combination in combinations:
+            self.add(combination)
+
+    def add(self, combination):
+        """将解combination加入索引。"""
+        combination = set(combination)
+        for item in combination:
+            self._partners.setdefault(item, set()).update(combination)
+
+    def blocked(self, names) -> np.ndarray:
+        """返回names两两之间是否出现在同一个解中的布尔矩阵。"""
+        positions = {}
+        for i, name in enumerate(names):
+            positions.setdefault(name, []).append(i)
+        blocked = np.zeros((len(names), len(names)), dtype=bool)
+        for i, name in enumerate(names):
+            partners = [k for partner in self._partners.get(name, ()) for k in positions.get(partner, [])]
+            blocked[i, partners] = True
+        return blocked
+
+
+def component(items_and_score, random_state=None, num=1000, c=10, n_jobs=1):
     """
     :param random_state:
     :param tcm:
     :param items_and_score: pd存储复方/中药信息
     :param num: 需要的解的组数
-    :return:
+    :param n_jobs: 并行的进程数，默认为1（不并行）。大于1时num组求解被均分到各进程，
+                   各进程使用由random_state派生的随机数种子独立求解，合并时去除重复的解；
+                   给定random_state和n_jobs时结果可复现
+    :return: 各组合及其Score和提升量，因与之前的解重复而被放弃的候选数记录在attrs['rejected']中
     """
     if 'HVPID' in items_and_score.columns:
         by = 'HVPID'
@@ -165,27 +441,16 @@ def component(items_and_score, random_state=None, num=1000, c=10):
         by = 'HVMID'
         name = 'cn_name'
 
-    dps = []
-    items_ls = []
-    n = len(items_and_score)
-    weights = [1 for _ in range(n)]
+    weights = [1 for _ in range(len(items_and_score))]
     names = [*items_and_score.loc[:, by]]
     values = [*items_and_score.loc[:, 'Importance Score']]
-    n = ceil(len(weights) / 10)
 
-    if random_state is not None:
-        random.seed(random_state)
-
-    for _ in tqdm(range(num)):
-        random_indices = random.sample(range(len(weights)), n)
-        weights = [weights[i] for i in random_indices]
-        names = [names[i] for i in random_indices]
-        values = [values[i] for i in random_indices]
-
-        # 不能再得出之前的解
-        dp, items = knapsack(weights, n, items_ls, names, values, c)
-        dps.append(dp)
-        items_ls.append(items)
+    if n_jobs > 1:
+        dps, items_ls, rejected = _parallel_solve(weights, names, values, c, num, random_state, n_jobs)
+    else:
+        if random_state is not None:
+            random.seed(random_state)
+        dps, items_ls, rejected = _solve(weights, names, values, c, num, random)
 
     # 用pd.DataFrame存储结果
     components = pd.DataFrame(dps)
@@ -204,10 +469,73 @@ def component(items_and_score, random_state=None, num=1000, c=10):
     components = components.sort_values(by='Boost', ascending=False)
     # 重新设置索引
     components.index = range(components.shape[0])
+    components.attrs['rejected'] = rejected
 
     return components
 
 
+def _solve(weights, names, values, c, num, rng, progress=True):
+    """使用随机数生成器rng依次求解num组互不重复的解，返回各解的Score、所选中药/复方及被放弃的重复候选数。"""
+    dps = []
+    items_ls = []
+    solutions = SolutionIndex()
+    n = ceil(len(weights) / 10)
+
+    # tqdm仅在需要显示进度时导入，以加快herbiv的导入
+    if progress:
+        from tqdm import tqdm
+    iterations = tqdm(range(num)) if progress else range(num)
+    for _ in iterations:
+        random_indices = rng.sample(range(len(weights)), n)
+        weights = [weights[i] for i in random_indices]
+        names = [names[i] for i in random_indices]
+        values = [values[i] for i in random_indices]
+
+        # 不能再得出之前的解
+        dp, items = knapsack(weights, n, solutions, names, values, c)
+        dps.append(dp)
+        items_ls.append(items)
+        solutions.add(items)
+        if progress:
+            iterations.set_postfix(rejected=solutions.rejected, refresh=False)
+
+    return dps, items_ls, solutions.rejected
+
+
+def _solve_seeded(weights, names, values, c, num, seed):
+    """在子进程中以seed为种子求解。"""
+    return _solve(weights, names, values, c, num, random.Random(seed), progress=False)
+
+
+def _parallel_solve(weights, names, values, c, num, random_state, n_jobs):
+    """将num组求解均分到n_jobs个进程，按进程顺序合并结果并去除重复的解。"""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from tqdm import tqdm
+
+    # 各进程的随机数种子由random_state派生
+    seeds = [int(seq.generate_state(1)[0]) for seq in np.random.SeedSequence(random_state).spawn(n_jobs)]
+    counts = [num // n_jobs + (i < num % n_jobs) for i in range(n_jobs)]
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(_solve_seeded, weights, names, values, c, count, seed)
+                   for count, seed in zip(counts, seeds) if count > 0]
+        with tqdm(total=num) as progress:
+            for future in as_completed(futures):
+                progress.update(len(future.result()[0]))
+        results = [future.result() for future in futures]
+
+    dps = []
+    items_ls = []
+    seen = set()
+    for worker_dps, worker_items, _ in results:
+        for dp, items in zip(worker_dps, worker_items):
+            if frozenset(items) not in seen:
+                seen.add(frozenset(items))
+                dps.append(dp)
+                items_ls.append(items)
+    return dps, items_ls, sum(result[2] for result in results)
+
+
 def boost(row, items_and_score, by):
     ls = row['items'].split(';')
     scores = [*items_and_score.loc[items_and_score[by].isin(ls)]['Importance Score']]
@@ -215,37 +543,38 @@ def boost(row, items_and_score, by):
 
 
 def knapsack(weights, n, forbidden_combinations, names, values, c=10):
-    # 创建一个二维列表用于存储计算结果
-    dp = [[0] * (c + 1) for _ in range(n + 1)]
-    # 创建一个二维列表用于记录选择的中药/复方
-    items = [[""] * (c + 1) for _ in range(n + 1)]
+    # dp[i][j]为前i个中药/复方在容量j下的最优Score
+    dp = np.zeros((n + 1, c + 1))
+    # take[i][j]记录是否选择了第i个中药/复方，用于最后回溯出所选的中药/复方
+    take = np.zeros((n + 1, c + 1), dtype=bool)
+    # 上一行各容量下已选的中药/复方（按位置），仅保留当前行和上一行
+    chosen = np.zeros((c + 1, n), dtype=bool)
+
+    # blocked[i]为与第i个中药/复方出现在同一禁止组合中的中药/复方：已选其中任一个时不能再选择第i个
+    # forbidden_combinations可为禁止组合的列表或SolutionIndex
+    if not isinstance(forbidden_combinations, SolutionIndex):
+        forbidden_combinations = SolutionIndex(forbidden_combinations)
+    blocked = forbidden_combinations.blocked(names[:n])
 
     for i in range(1, n + 1):
-        for j in range(1, c + 1):
-            if weights[i - 1] <= j:
-                # 检查当前是否与禁止组合冲突
-                conflict = False
-                for combination in forbidden_combinations:
-                    if names[i - 1] in combination and any(
-                            item in items[i - 1][j - weights[i - 1]] for item in combination):
-                        conflict = True
-                        break
-                if conflict:
-                    dp[i][j] = dp[i - 1][j]
-                    items[i][j] = items[i - 1][j]
-                else:
-                    if 1 - (1 - values[i - 1]) * (1 - dp[i - 1][j - weights[i - 1]]) > dp[i - 1][j]:
-                        dp[i][j] = 1 - (1 - values[i - 1]) * (1 - dp[i - 1][j - weights[i - 1]])
-                        items[i][j] = names[i - 1] + ", " + items[i - 1][j - weights[i - 1]]
-                    else:
-                        dp[i][j] = dp[i - 1][j]
-                        items[i][j] = items[i - 1][j]
-            else:
-                dp[i][j] = dp[i - 1][j]
-                items[i][j] = items[i - 1][j]
-
-    # 优化中药/复方存储
-    items = [s[:-2] for s in items[-1]]
+        dp[i] = dp[i - 1]
+        chosen_next = chosen.copy()
+        w = weights[i - 1]
+        lo = max(w, 1)
+        if lo <= c:
+            # 容量j由容量j - w转移而来，检查当前是否与禁止组合冲突
+            conflict = (chosen[lo - w:c + 1 - w] & blocked[i - 1]).any(axis=1)
+            candidate = 1 - (1 - values[i - 1]) * (1 - dp[i - 1, lo - w:c + 1 - w])
+            better = candidate > dp[i - 1, lo:]
+            forbidden_combinations.rejected += int((conflict & better).sum())
+            better &= ~conflict
+
+            j = np.flatnonzero(better) + lo
+            dp[i, j] = candidate[better]
+            take[i, j] = True
+            chosen_next[j] = chosen[j - w]
+            chosen_next[j, i - 1] = True
+        chosen = chosen_next
 
     # 计算累计Score比例
     score_ratio = np.cumsum(dp[-1]) / np.sum(dp)
@@ -257,7 +586,15 @@ def knapsack(weights, n, forbidden_combinations, names, values, c=10):
     num_components = np.argmin(mle_estimates) + 1
     num_components = 2 if num_components <= 1 else num_components
 
-    return dp[-1][num_components], items[num_components].split(', ')
+    # 回溯所选的中药/复方（后选择的在前）
+    items = []
+    j = num_components
+    for i in range(n, 0, -1):
+        if take[i, j]:
+            items.append(names[i - 1])
+            j -= weights[i - 1]
+
+    return float(dp[-1][num_components]), items if items else ['']
 
 
 if __name__ == '__main__':
@@ -0,0 +1,961 @@
+import os
+import json
+import hashlib
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+# 各数据集的名称及其文件名。Names of the datasets and their file names.
+TABLES = {
+    'formula': 'HerbiV_formula.csv',
+    'formula_tcm_links': 'HerbiV_formula_tcm_links.csv',
+    'tcm': 'HerbiV_tcm.csv',
+    'tcm_chem_links': 'HerbiV_tcm_chemical_links.csv',
+    'chemicals': 'HerbiV_chemicals.csv',
+    'chem_protein_links': 'HerbiV_chemical_protein_links.csv',
+    'proteins': 'HerbiV_proteins.csv',
+}
+
+# 数据集所在的目录，可通过环境变量HERBIV_DATA_DIR或set_data_dir指定，默认为herbiv/data。
+# Directory of the datasets, which can be set by the environment variable HERBIV_DATA_DIR or set_data_dir.
+# herbiv/data by default.
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+_data_dir = os.environ.get('HERBIV_DATA_DIR') or DEFAULT_DATA_DIR
+
+# 缓存的内存上限（字节），可通过环境变量HERBIV_CACHE_MB（单位为MB）设置，默认为1024 MB。
+# Memory budget of the cache in bytes, which can be set by the environment variable HERBIV_CACHE_MB (in MB).
+_cache_limit = int(float(os.environ.get('HERBIV_CACHE_MB', 1024)) * 1024 * 1024)
+
+# 表名 -> (文件状态, 数据集, 占用内存, 列名 -> KeyIndex)，按最近使用顺序排列。
+# Table name -> (file stat, dataset, memory usage, column name -> KeyIndex),
+# ordered from least to most recently used.
+_cache = OrderedDict()
+_cache_bytes = 0
+_lock = threading.RLock()
+
+# 分块读取CSV时每块的行数，可通过环境变量HERBIV_CHUNKSIZE设置，默认为None，即不分块读取。
+# Number of rows per chunk when reading CSVs in chunks, which can be set by the environment variable
+# HERBIV_CHUNKSIZE. None by default, i.e. CSVs are read as a whole.
+_chunksize = int(os.environ['HERBIV_CHUNKSIZE']) if os.environ.get('HERBIV_CHUNKSIZE') else None
+
+# (表名, 列式存储目录) -> (列式存储的状态, ColumnStore)。
+# (Table name, directory of the columnar store) -> (stat of the columnar store, ColumnStore).
+_stores = {}
+
+# 共享列式存储的目录，由share设置或通过环境变量HERBIV_SHARED_DIR继承，默认为None。
+# 数据集目录中没有最新的列式存储时，从该目录中打开。
+# Directory of the shared columnar stores, set by share or inherited through the environment variable
+# HERBIV_SHARED_DIR. None by default. Stores are opened from it when the data directory has no up-to-date store.
+_shared_dir = os.environ.get('HERBIV_SHARED_DIR') or None
+
+# 列式存储的格式版本及定长存储字符串列的最大字节数。
+# Format version of the columnar store and the maximum byte length of string columns stored with fixed width.
+STORE_VERSION = 4
+FIXED_WIDTH = 32
+
+# 建立查找索引的键列。Key columns for which lookup indexes are built.
+KEY_COLUMNS = ('HVPID', 'HVMID', 'HVCID', 'Ensembl_ID')
+
+# 键列中不重复的ID不超过行数的该比例时，缓存中以Categorical表示（每行一个ID的实体表保持字符串）。
+# Key columns whose distinct IDs are at most this fraction of the rows are held as Categorical in the cache
+# (entity tables with one ID per row keep strings).
+CATEGORICAL_RATIO = 0.5
+
+# 按分数列降序存储的数据集，select可直接定位到分数大于等于阈值的行。
+# Datasets stored in descending order of a score column, so that select can seek directly
+# to the rows whose score is no less than a threshold.
+PARTITIONS = {'chem_protein_links': 'Combined_score'}
+
+
+def path(name) -> str:
+    """
+        返回数据集name的文件路径。
+        Return the file path of the dataset name.
+
+        Args:
+            name (str): 数据集名称，为TABLES的键之一。Name of the dataset, one of the keys of TABLES.
+
+        Returns:
+            str: 数据集的文件路径。File path of the dataset.
+    """
+    if name not in TABLES:
+        raise KeyError(f"Unknown HerbiV dataset: {name}. Available datasets: {', '.join(TABLES)}.")
+    return os.path.join(_data_dir, TABLES[name])
+
+
+def store_path(name) -> str:
+    """
+        返回数据集name的列式存储目录。
+        Return the directory of the columnar store of the dataset name.
+
+        Args:
+            name (str): 数据集名称，为TABLES的键之一。Name of the dataset, one of the keys of TABLES.
+
+        Returns:
+            str: 列式存储目录。Directory of the columnar store.
+    """
+    return os.path.splitext(path(name))[0] + '.store'
+
+
+def _stat(file):
+    st = os.stat(file)
+    return st.st_mtime_ns, st.st_size
+
+
+class KeyIndex:
+    """
+        键列的查找索引，由排序后的键及其在数据集中的行号组成。
+        查询的时间与匹配的行数成正比（另加对数级的二分查找），而与数据集的大小无关。
+        Lookup index of a key column, made of the sorted keys and their row numbers in the dataset.
+        A query takes time proportional to the number of matching rows (plus a logarithmic binary search)
+        rather than to the size of the dataset.
+    """
+
+    def __init__(self, keys, order):
+        self.keys = keys
+        self.order = order
+
+    @classmethod
+    def build(cls, values):
+        """为values（键列的值，缺失值不进入索引）建立索引。"""
+        values = np.asarray(values)
+        rows = np.flatnonzero(pd.notna(values))
+        keys = values[rows].astype(str) if values.dtype == object else values[rows]
+        order = np.argsort(keys, kind='stable')
+        return cls(keys[order], rows[order])
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.order.nbytes
+
+    def _ranges(self, items):
+        """返回items（字符串）中各键在排序后的键中的起始位置及出现次数。"""
+        items = list(items)
+        if self.keys.dtype.kind == 'S':
+            items = [item.encode('utf-8') for item in items]
+        items = np.unique(np.array(items, dtype=self.keys.dtype.kind))
+
+        lo = np.searchsorted(self.keys, items, 'left')
+        counts = np.searchsorted(self.keys, items, 'right') - lo
+        return lo[counts > 0], counts[counts > 0]
+
+    def count(self, items) -> int:
+        """返回键在items中的行数。"""
+        return int(self._ranges(items)[1].sum())
+
+    def positions(self, items) -> np.ndarray:
+        """返回键在items中的行的行号（升序）。"""
+        lo, counts = self._ranges(items)
+
+        # 将各[lo, lo + count)区间拼接为排序后键的下标
+        offsets = np.repeat(lo - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+        return np.sort(self.order[offsets + np.arange(offsets.shape[0])])
+
+
+class ThresholdIndex:
+    """
+        按分数列降序排列的行号，用于直接取出分数大于等于阈值的行，而无需扫描整个数据集。
+        Row numbers in descending order of a score column, used to take the rows whose score is
+        no less than a threshold directly instead of scanning the whole dataset.
+    """
+
+    def __init__(self, values, order=None):
+        # values为降序排列的分数；order为其行号，为None时数据集本身即按分数降序存储
+        self.values = values
+        self.order = order
+
+    @classmethod
+    def build(cls, values):
+        """为values（分数列的值）建立索引。"""
+        values = np.asarray(values)
+        order = np.argsort(-values, kind='stable')
+        return cls(values[order], order)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + (0 if self.order is None else self.order.nbytes)
+
+    def count(self, threshold) -> int:
+        """返回分数大于等于threshold的行数。"""
+        return int(self.values.shape[0] - np.searchsorted(self.values[::-1], threshold, 'left'))
+
+    def head(self, threshold) -> np.ndarray:
+        """返回分数大于等于threshold的行的行号（无序）。"""
+        k = self.count(threshold)
+        return np.arange(k) if self.order is None else np.asarray(self.order[:k])
+
+
+class ColumnStore:
+    """
+        内存映射的列式数据集。每列存储为一个或多个.npy文件，仅在被访问时映射，仅物化查询所需的行。
+        Memory-mapped columnar dataset. Each column is stored as one or more .npy files,
+        which are mapped only when accessed, and only the rows required by a query are materialised.
+
+        数值列直接存储为NumPy数组；键列（KEY_COLUMNS）以字典编码存储为整数编码及排序后的不重复ID；
+        其他不超过FIXED_WIDTH字节的字符串列存储为定长字节串数组；更长的字符串列存储为UTF-8字节缓冲区及偏移量数组。
+        Numeric columns are stored as NumPy arrays; key columns (KEY_COLUMNS) are dictionary-encoded as integer
+        codes and the sorted distinct IDs; other string columns of at most FIXED_WIDTH bytes are stored
+        as fixed-width byte string arrays; longer string columns are stored as a UTF-8 buffer and an offset array.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.nrows = self.meta['nrows']
+        self.columns = [col['name'] for col in self.meta['columns']]
+        self._specs = {col['name']: (i, col['kind']) for i, col in enumerate(self.meta['columns'])}
+        self._arrays = {}
+        self._categories = {}
+
+    def _array(self, file):
+        if file not in self._arrays:
+            self._arrays[file] = np.load(os.path.join(self.directory, file), mmap_mode='r')
+        return self._arrays[file]
+
+    def categories(self, column) -> np.ndarray:
+        """返回字典编码列的不重复ID（已解码，末尾附加表示缺失值的NaN，使编码-1对应NaN）。"""
+        i, _ = self._specs[column]
+        if i not in self._categories:
+            categories = np.char.decode(np.asarray(self._array(f'{i}.categories.npy')), 'utf-8').astype(object)
+            self._categories[i] = np.append(categories, np.nan)
+        return self._categories[i]
+
+    def raw(self, column) -> np.ndarray:
+        """返回数值列或定长字符串列的内存映射数组，字典编码列返回其编码。"""
+        i, kind = self._specs[column]
+        if kind == 'cat':
+            return self._array(f'{i}.codes.npy')
+        if kind == 'var':
+            raise TypeError(f'Column {column} is stored with variable width.')
+        return self._array(f'{i}.npy')
+
+    def threshold_index(self):
+        """返回按分数降序存储时的阈值索引，否则返回None。"""
+        if 'sorted' not in self.meta:
+            return None
+        return ThresholdIndex(self.raw(self.meta['sorted']))
+
+    def restore(self, rows) -> np.ndarray:
+        """将存储顺序下的rows（布尔掩码或位置）转换为按CSV中原始顺序排列的位置。"""
+        rows = np.flatnonzero(rows) if rows.dtype == bool else np.sort(rows)
+        if 'sorted' not in self.meta:
+            return rows
+        return rows[np.argsort(self._array('row.npy')[rows], kind='stable')]
+
+    def index(self, column):
+        """返回column的持久化查找索引，若未建立索引则返回None。"""
+        i, kind = self._specs[column]
+        if not os.path.exists(os.path.join(self.directory, f'{i}.order.npy')):
+            return None
+        return KeyIndex(self._array(f'{i}.keys.npy'), self._array(f'{i}.order.npy'))
+
+    def mask(self, column, items, rows=None) -> np.ndarray:
+        """
+        返回column中rows（位置，默认为全部行）的取值是否在items中的布尔掩码，定长列无需解码即可比较。
+        items中含有非字符串（如NaN）时解码后以pandas.Series.isin比较，结果与之相同。
+        """
+        i, kind = self._specs[column]
+        items = list(items)
+        if kind == 'var' or (kind != 'num' and not all(isinstance(item, str) for item in items)):
+            return pd.Series(self.column(column, rows)).isin(items).to_numpy()
+        rows = slice(None) if rows is None else rows
+        if kind == 'cat':
+            # 将items转换为编码后比较整数
+            categories = self._array(f'{i}.categories.npy')
+            items = np.unique(np.array([item.encode('utf-8') for item in items], dtype=categories.dtype))
+            codes = np.minimum(np.searchsorted(categories, items), max(len(categories) - 1, 0))
+            codes = codes[categories[codes] == items] if len(categories) else codes[:0]
+            return np.isin(self.raw(column)[rows], codes)
+        if kind == 'fixed':
+            items = np.array([item.encode('utf-8') for item in items], dtype=bytes)
+            mask = np.isin(self.raw(column)[rows], items)
+            return mask & ~self._array(f'{i}.null.npy')[rows]
+        return np.isin(self.raw(column)[rows], np.asarray(items))
+
+    def column(self, column, rows=None, categorical=False):
+        """
+        物化column中rows（布尔掩码或位置，默认为全部行）对应的值，缺失值为NaN。
+        字典编码列在categorical为True且不重复的ID不超过行数的CATEGORICAL_RATIO时返回pandas.Categorical，
+        否则解码为字符串（同一ID共用一个字符串对象）。
+        """
+        i, kind = self._specs[column]
+        rows = slice(None) if rows is None else rows
+
+        if kind == 'num':
+            return np.array(self._array(f'{i}.npy')[rows])
+        if kind == 'cat':
+            codes = np.array(self._array(f'{i}.codes.npy')[rows])
+            encoded = self._array(f'{i}.categories.npy')
+            if categorical and len(encoded) <= self.nrows * CATEGORICAL_RATIO:
+                return pd.Categorical.from_codes(codes, self.categories(column)[:-1])
+            if i in self._categories or len(codes) >= len(encoded):
+                return self.categories(column)[codes]
+            # 选取的行少于不重复的ID时仅解码用到的ID，不在每个进程中物化完整的ID列表
+            used, inverse = np.unique(codes, return_inverse=True)
+            values = np.full(len(used), np.nan, dtype=object)
+            values[used >= 0] = np.char.decode(np.asarray(encoded[used[used >= 0]]), 'utf-8').astype(object)
+            return values[inverse.reshape(-1)]
+
+        null = np.asarray(self._array(f'{i}.null.npy')[rows])
+        if kind == 'fixed':
+            values = np.char.decode(np.asarray(self._array(f'{i}.npy')[rows]), 'utf-8').astype(object)
+        else:
+            offsets = self._array(f'{i}.offsets.npy')
+            buffer = self._array(f'{i}.data.npy')
+            if isinstance(rows, slice):
+                starts, ends = offsets[:-1], offsets[1:]
+                data = buffer.tobytes()
+                values = np.array([data[a:b].decode('utf-8') for a, b in zip(starts, ends)], dtype=object)
+            else:
+                # 通过memoryview切片，避免为每行创建memmap对象
+                starts, ends = offsets[:-1][rows].tolist(), offsets[1:][rows].tolist()
+                data = memoryview(np.asarray(buffer))
+                values = np.array([str(data[a:b], 'utf-8') for a, b in zip(starts, ends)], dtype=object)
+        values[null] = np.nan
+        return values
+
+    def frame(self, columns=None, rows=None, categorical=False) -> pd.DataFrame:
+        """
+        物化columns（默认为全部列）中rows（默认为按原始顺序排列的全部行）对应的行，并返回以0开始编号的DataFrame。
+        categorical为True时，字典编码列按column中的规则以pandas.Categorical返回。
+        """
+        columns = self.columns if columns is None else columns
+        if rows is None and 'sorted' in self.meta:
+            rows = np.argsort(self._array('row.npy'))
+        return pd.DataFrame({column: self.column(column, rows, categorical) for column in columns}, columns=columns)
+
+
+def _write_store(table, directory, source, sort_by=None):
+    """将table写入列式存储目录directory，source为其CSV文件的状态；指定sort_by时按该列降序存储。"""
+    tmp = f'{directory}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    meta = {'version': STORE_VERSION, 'source': list(source), 'nrows': len(table)}
+    if sort_by is not None:
+        # 按分数降序存储，并记录各行在CSV中的原始行号，以便按原始顺序返回结果
+        order = np.argsort(-table[sort_by].to_numpy(), kind='stable')
+        table = table.iloc[order]
+        np.save(os.path.join(tmp, 'row.npy'), order)
+        meta['sorted'] = sort_by
+
+    columns = []
+    for i, column in enumerate(table.columns):
+        values = table[column]
+        if values.dtype != object:
+            np.save(os.path.join(tmp, f'{i}.npy'), values.to_numpy())
+            columns.append({'name': column, 'kind': 'num'})
+            continue
+
+        null = values.isna().to_numpy()
+        encoded = [b'' if n else str(v).encode('utf-8') for v, n in zip(values, null)]
+        if column in KEY_COLUMNS:
+            # 键列以字典编码存储：排序后的不重复ID及各行的编码（缺失值为-1）
+            encoded = np.array(encoded, dtype=bytes)
+            categories, codes = np.unique(encoded[~null], return_inverse=True)
+            full = np.full(len(encoded), -1, dtype=np.int32)
+            full[~null] = codes
+            np.save(os.path.join(tmp, f'{i}.categories.npy'), categories)
+            np.save(os.path.join(tmp, f'{i}.codes.npy'), full)
+            columns.append({'name': column, 'kind': 'cat'})
+
+            # 持久化键列的查找索引
+            index = KeyIndex.build(np.where(null, None, encoded.astype(object)))
+            np.save(os.path.join(tmp, f'{i}.keys.npy'), index.keys.astype(bytes))
+            np.save(os.path.join(tmp, f'{i}.order.npy'), index.order)
+            continue
+
+        np.save(os.path.join(tmp, f'{i}.null.npy'), null)
+        if max(map(len, encoded), default=0) <= FIXED_WIDTH:
+            encoded = np.array(encoded, dtype=bytes)
+            np.save(os.path.join(tmp, f'{i}.npy'), encoded)
+            columns.append({'name': column, 'kind': 'fixed'})
+        else:
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(v) for v in encoded], out=offsets[1:])
+            np.save(os.path.join(tmp, f'{i}.offsets.npy'), offsets)
+            np.save(os.path.join(tmp, f'{i}.data.npy'), np.frombuffer(b''.join(encoded), dtype=np.uint8))
+            columns.append({'name': column, 'kind': 'var'})
+
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(dict(meta, columns=columns), f, ensure_ascii=False)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(tmp, directory)
+
+
+def convert(names=None):
+    """
+        将CSV格式的数据集一次性转换为内存映射的列式存储（存放于数据集同目录下的.store目录中）。
+        CSV发生变化后需重新转换，否则将继续读取CSV。
+        Convert the CSV datasets once into memory-mapped columnar stores (.store directories next to the datasets).
+        The conversion must be repeated after a CSV changes, otherwise the CSV is read instead.
+
+        Args:
+            names (collections.abc.Iterable): 要转换的数据集名称，默认为None，即转换所有存在的数据集。
+            Names of the datasets to be converted, None by default, i.e. all existing datasets are converted.
+
+        Examples:
+            >>> convert(['chem_protein_links'])
+    """
+    if names is None:
+        names = [name for name in TABLES if os.path.exists(path(name))]
+    for name in names:
+        _write_store(pd.read_csv(path(name)), store_path(name), _stat(path(name)), PARTITIONS.get(name))
+        with _lock:
+            _stores.pop((name, store_path(name)), None)
+
+
+def _store_dirs(name):
+    """返回数据集name的列式存储可能所在的目录：数据集目录中的.store目录，以及共享目录中的同名目录。"""
+    directories = [store_path(name)]
+    if _shared_dir is not None:
+        directories.append(os.path.join(_shared_dir, os.path.basename(store_path(name))))
+    return directories
+
+
+def open_store(name):
+    """
+        打开数据集name的列式存储。
+        Open the columnar store of the dataset name.
+
+        Args:
+            name (str): 数据集名称，为TABLES的键之一。Name of the dataset, one of the keys of TABLES.
+
+        Returns:
+            ColumnStore: 列式存储（数据集目录中没有最新的列式存储时，从share的共享目录中打开）；
+            若其不存在或已过期（CSV在转换后发生了变化），则返回None。
+            The columnar store (opened from the shared directory of share if the data directory has no
+            up-to-date store), or None if it is missing or out of date (the CSV changed after the conversion).
+    """
+    for directory in _store_dirs(name):
+        try:
+            stat = _stat(os.path.join(directory, 'meta.json'))
+        except FileNotFoundError:
+            continue
+
+        with _lock:
+            if (name, directory) not in _stores or _stores[(name, directory)][0] != stat:
+                store = ColumnStore(directory)
+                source = tuple(store.meta['source'])
+                if store.meta['version'] != STORE_VERSION or \
+                        (os.path.exists(path(name)) and _stat(path(name)) != source):
+                    store = None
+                _stores[(name, directory)] = (stat, store)
+            store = _stores[(name, directory)][1]
+        if store is not None:
+            return store
+    return None
+
+
+def share(directory=None) -> str:
+    """
+        使之后创建（fork或spawn）的工作进程共用同一份数据集：为没有最新列式存储的数据集在directory中建立列式存储，
+        并清空本进程的缓存。各进程以只读内存映射的方式打开这些列式存储，数据由操作系统的页缓存在进程间共享，
+        每个进程仅物化查询所需的行，因此工作进程的私有内存与数据集大小无关。
+        适用于进程池创建之前或预派生（pre-fork）服务器派生工作进程之前；数据集目录本身不会被修改。
+        Let worker processes created afterwards (by fork or spawn) share one copy of the datasets: columnar stores
+        are written to directory for the datasets without an up-to-date store, and the cache of this process is
+        cleared. Every process opens these stores as read-only memory maps, whose pages are shared between processes
+        by the page cache of the operating system, and only materialises the rows its queries need, so the private
+        memory of the workers does not depend on the size of the datasets.
+        Call it before creating a process pool or before a pre-fork server forks its workers;
+        the data directory itself is not modified.
+
+        Args:
+            directory (str): 共享列式存储的目录，默认为None，即临时目录下由数据集目录决定的子目录（再次调用时复用）。
+            Directory of the shared columnar stores, None by default, i.e. a subdirectory of the temporary directory
+            derived from the data directory (reused by later calls).
+
+        Returns:
+            str: 共享列式存储的目录，已写入环境变量HERBIV_SHARED_DIR，以便spawn的子进程继承。
+            Directory of the shared columnar stores, which is also written to the environment variable
+            HERBIV_SHARED_DIR so that spawned subprocesses inherit it.
+
+        Examples:
+            >>> share()
+            '/tmp/herbiv-shared-3f0c5a1e9b2d'
+            >>> with ProcessPoolExecutor(8) as executor:
+            ...     results = list(executor.map(work, tasks))
+    """
+    if directory is None:
+        digest = hashlib.sha1(os.path.abspath(_data_dir).encode('utf-8')).hexdigest()[:12]
+        directory = os.path.join(tempfile.gettempdir(), f'herbiv-shared-{digest}')
+    directory = os.path.abspath(directory)
+    _write_shared(directory)
+
+    # 清空缓存，派生的子进程不再继承（并因引用计数逐页复制）已读取的数据集
+    clear()
+    os.environ['HERBIV_SHARED_DIR'] = directory
+    return directory
+
+
+@contextmanager
+def shared(directory=None):
+    """
+        在with语句块中启用share：退出时恢复之前的共享目录和环境变量HERBIV_SHARED_DIR，并删除为该语句块新建的共享列式存储。
+        与share不同，本进程的缓存不会被清空。适用于在语句块中创建并关闭进程池的批量分析。
+        Enable share within a with block: on exit the previous shared directory and HERBIV_SHARED_DIR are restored
+        and the shared columnar stores created for the block are deleted. Unlike share, the cache of this process
+        is kept. Meant for batch runs that create and shut down a process pool within the block.
+
+        Args:
+            directory (str): 共享列式存储的目录，默认为None，即新建的临时目录（退出时整个删除）。
+            Directory of the shared columnar stores, None by default, i.e. a new temporary directory
+            (removed as a whole on exit).
+
+        Returns:
+            str: 共享列式存储的目录（with语句的目标）。Directory of the shared columnar stores (target of the with statement).
+
+        Examples:
+            >>> with shared():
+            ...     with ProcessPoolExecutor(8) as executor:
+            ...         results = list(executor.map(work, tasks))
+    """
+    global _shared_dir
+    previous, environ = _shared_dir, os.environ.get('HERBIV_SHARED_DIR')
+    temporary = directory is None
+    directory = tempfile.mkdtemp(prefix='herbiv-shared-') if temporary else os.path.abspath(directory)
+    created = []
+    try:
+        created = _write_shared(directory)
+        os.environ['HERBIV_SHARED_DIR'] = directory
+        yield directory
+    finally:
+        with _lock:
+            _shared_dir = previous
+            for key in [key for key in _stores if os.path.dirname(key[1]) == directory]:
+                del _stores[key]
+        if environ is None:
+            os.environ.pop('HERBIV_SHARED_DIR', None)
+        else:
+            os.environ['HERBIV_SHARED_DIR'] = environ
+        for store in [directory] if temporary else created:
+            shutil.rmtree(store, ignore_errors=True)
+
+
+def _write_shared(directory) -> list:
+    """将directory设为共享目录，并在其中为没有最新列式存储的数据集建立列式存储，返回新建的列式存储目录。"""
+    global _shared_dir
+    os.makedirs(directory, exist_ok=True)
+    with _lock:
+        _shared_dir = directory
+
+    created = []
+    for name in TABLES:
+        if open_store(name) is None and os.path.exists(path(name)):
+            created.append(os.path.join(directory, os.path.basename(store_path(name))))
+            _write_store(pd.read_csv(path(name)), created[-1], _stat(path(name)), PARTITIONS.get(name))
+    return created
+
+
+def _evict(limit):
+    """按LRU顺序淘汰缓存中的数据集，直至其占用的内存不超过limit。"""
+    global _cache_bytes
+    while _cache and _cache_bytes > limit:
+        _, (_, _, nbytes, _) = _cache.popitem(last=False)
+        _cache_bytes -= nbytes
+
+
+def load(name, columns=None) -> pd.DataFrame:
+    """
+        读取数据集name。数据集仅在首次读取或其文件发生变化后才会被解析，之后直接从进程内缓存中返回。
+        返回值与其他调用共享，不应被就地修改。若存在最新的列式存储，则从中读取，否则读取CSV。
+        连接表等ID重复较多的键列（KEY_COLUMNS）以pandas.Categorical（整数编码）表示，以减少内存占用并加快比较；
+        select及get中的函数返回的结果已解码为字符串。
+        Read the dataset name. The dataset is parsed only on the first call or after its file has changed,
+        afterwards it is returned directly from the in-process cache.
+        The return value is shared with other callers and should not be modified in place.
+        The dataset is read from its columnar store if it is up to date, otherwise from the CSV.
+        Key columns (KEY_COLUMNS) with many repeated IDs, such as those of the link tables, are held as
+        pandas.Categorical (integer codes) to save memory and to speed up comparisons;
+        the results of select and of the functions in get are decoded to strings.
+
+        Args:
+            name (str): 数据集名称，为TABLES的键之一。Name of the dataset, one of the keys of TABLES.
+            columns (list): 要读取的列，默认为None，即读取全部列。
+            指定columns且存在列式存储时仅物化这些列，且结果不进入缓存。
+            Columns to be read, None by default, i.e. all columns are read. If columns are specified and
+            the columnar store exists, only these columns are materialised and the result is not cached.
+
+        Returns:
+            pandas.DataFrame: 数据集。The dataset.
+
+        Examples:
+            >>> load('formula').shape
+            (6191, 6)
+    """
+    global _cache_bytes
+    store = open_store(name)
+    if columns is not None:
+        return store.frame(columns, categorical=True) if store is not None else load(name)[columns]
+
+    stat = store.meta['source'] if store is not None else _stat(path(name))
+    stat = tuple(stat) + (store is not None, )
+
+    with _lock:
+        # 文件未发生变化时直接使用缓存
+        if name in _cache and _cache[name][0] == stat:
+            _cache.move_to_end(name)
+            return _cache[name][1]
+
+        table = store.frame(categorical=True) if store is not None else _encode(pd.read_csv(path(name)))
+        nbytes = int(table.memory_usage(deep=True).sum())
+
+        if name in _cache:
+            _cache_bytes -= _cache.pop(name)[2]
+
+        # 超过内存上限的数据集不进入缓存
+        if nbytes <= _cache_limit:
+            _evict(_cache_limit - nbytes)
+            _cache[name] = [stat, table, nbytes, {}]
+            _cache_bytes += nbytes
+
+        return table
+
+
+def _encode(table) -> pd.DataFrame:
+    """将table中不重复的ID不超过行数的CATEGORICAL_RATIO的字符串键列转换为pandas.Categorical。"""
+    for column in KEY_COLUMNS:
+        if column in table.columns and table[column].dtype == object and \
+                table[column].nunique() <= len(table) * CATEGORICAL_RATIO:
+            table[column] = table[column].astype('category')
+    return table
+
+
+def _decode(table) -> pd.DataFrame:
+    """将table中的Categorical列解码为字符串（同一ID共用一个字符串对象）。"""
+    for column in table.columns:
+        if isinstance(table[column].dtype, pd.CategoricalDtype):
+            table[column] = table[column].astype(object)
+    return table
+
+
+def index(name, column, table=None):
+    """
+        返回数据集name中键列column的查找索引。
+        列式存储的索引在转换时持久化；CSV数据集的索引在首次使用时建立，并与数据集一同缓存。
+        Return the lookup index of the key column column in the dataset name.
+        Indexes of columnar stores are persisted during the conversion; indexes of CSV datasets are built
+        on first use and cached together with the dataset.
+
+        Args:
+            name (str): 数据集名称，为TABLES的键之一。Name of the dataset, one of the keys of TABLES.
+            column (str): 键列的列名，为KEY_COLUMNS之一。Column name of the key column, one of KEY_COLUMNS.
+            table (pandas.DataFrame): 已由load读取的数据集，默认为None，即在需要时读取。
+            The dataset already read by load, None by default, i.e. it is read when needed.
+
+        Returns:
+            KeyIndex: 查找索引；若column不是键列或数据集未被缓存，则返回None。
+            The lookup index, or None if column is not a key column or the dataset is not cached.
+    """
+    if column not in KEY_COLUMNS:
+        return None
+
+    store = open_store(name)
+    if store is not None:
+        return store.index(column) if column in store.columns else None
+    return _cached_index(name, column, KeyIndex.build, KeyIndex, table)
+
+
+def threshold_index(name, table=None):
+    """
+        返回数据集name的分数阈值索引（分数列见PARTITIONS）。
+        列式存储本身按分数降序存储；CSV数据集的索引在首次使用时建立，并与数据集一同缓存。
+        Return the score threshold index of the dataset name (see PARTITIONS for the score columns).
+        Columnar stores are themselves stored in descending order of the score; indexes of CSV datasets
+        are built on first use and cached together with the dataset.
+
+        Args:
+            name (str): 数据集名称，为TABLES的键之一。Name of the dataset, one of the keys of TABLES.
+            table (pandas.DataFrame): 已由load读取的数据集，默认为None，即在需要时读取。
+            The dataset already read by load, None by default, i.e. it is read when needed.
+
+        Returns:
+            ThresholdIndex: 阈值索引；若数据集没有分数列或未被缓存，则返回None。
+            The threshold index, or None if the dataset has no score column or is not cached.
+    """
+    if name not in PARTITIONS:
+        return None
+
+    store = open_store(name)
+    if store is not None:
+        return store.threshold_index()
+    return _cached_index(name, PARTITIONS[name], ThresholdIndex.build, ThresholdIndex, table)
+
+
+def _cached_index(name, column, build, kind=KeyIndex, table=None):
+    """
+    返回与缓存中的数据集name一同缓存的column列的索引，必要时使用build建立。
+    table为已读取的数据集，默认为None，即调用load；数据集未被缓存（如超过内存上限）时返回None，不再重复解析。
+    """
+    global _cache_bytes
+    table = load(name) if table is None else table
+    with _lock:
+        if name not in _cache or _cache[name][1] is not table or column not in table.columns:
+            return None
+        indexes = _cache[name][3]
+        if (kind, column) not in indexes:
+            indexes[(kind, column)] = build(table[column].to_numpy())
+            _cache[name][2] += indexes[(kind, column)].nbytes
+            _cache_bytes += indexes[(kind, column)].nbytes
+            _evict(_cache_limit)
+        return indexes[(kind, column)]
+
+
+def _scan(name, by, items, columns, where, chunksize):
+    """分块读取CSV数据集name，在每一块中筛选出符合条件的行，内存峰值由chunksize决定。"""
+    items = pd.unique(np.asarray(list(items), dtype=object))
+    parts = []
+    for chunk in pd.read_csv(path(name), chunksize=chunksize):
+        mask = chunk[by].isin(items)
+        if where is not None:
+            mask &= where(chunk)
+        parts.append(chunk.loc[mask, chunk.columns if columns is None else columns])
+    selected = pd.concat(parts) if parts else pd.read_csv(path(name), nrows=0, usecols=columns)
+    selected.index = range(selected.shape[0])
+    return selected
+
+
+def select(name, by, items, columns=None, where=None, chunksize=None, threshold=None) -> pd.DataFrame:
+    """
+        返回数据集name中by列的取值在items中的行（副本，以0开始编号）。
+        若存在最新的列式存储，则仅读取by列进行筛选，再物化被选中的行。
+        Return the rows of the dataset name whose values in the column by are in items (a copy indexed from 0).
+        If the columnar store is up to date, only the column by is read for filtering
+        and then the selected rows are materialised.
+        by为键列（KEY_COLUMNS）时使用查找索引，无需扫描整个数据集。
+        If by is a key column (KEY_COLUMNS), the lookup index is used instead of scanning the whole dataset.
+
+        Args:
+            name (str): 数据集名称，为TABLES的键之一。Name of the dataset, one of the keys of TABLES.
+            by (str): 数据集中与items相匹配的列的列名。Column name of the column in the dataset that matches items.
+            items (collections.abc.Iterable): 要查询的值。Values to be queried.
+            columns (list): 要返回的列，默认为None，即返回全部列。Columns to be returned, None by default, i.e. all.
+            where (collections.abc.Callable): 额外的筛选条件，接收DataFrame并返回布尔掩码，默认为None。
+            Additional filter, which takes a DataFrame and returns a boolean mask, None by default.
+            chunksize (int): 若不为None（默认为set_chunksize的设置），且数据集既无列式存储也未被缓存，
+            则分块读取CSV并在每一块中应用by/items和where筛选，内存峰值由chunksize而非数据集大小决定。
+            If not None (defaults to the value of set_chunksize) and the dataset has neither a columnar store
+            nor a cached copy, the CSV is read in chunks and the by/items and where filters are applied
+            to each chunk, so that peak memory is bounded by chunksize instead of the size of the dataset.
+            threshold: 仅返回分数列（见PARTITIONS）大于等于threshold的行，默认为None。
+            若高于阈值的行少于与items匹配的行，则直接定位到高分部分，仅检查这些行。
+            Only rows whose score column (see PARTITIONS) is no less than threshold are returned, None by default.
+            If fewer rows are above the threshold than match items, the query seeks directly to the high-score
+            part and only checks those rows.
+
+        Returns:
+            pandas.DataFrame: 被选中的行。The selected rows.
+
+        Examples:
+            >>> select('formula_tcm_links', 'HVPID', ['HVP1625'])
+                 HVPID    HVMID
+            0  HVP1625  HVM0367
+            ...
+    """
+    if isinstance(items, str) or not pd.api.types.is_list_like(items):
+        raise TypeError(f"only list-like objects are allowed to be passed to select(), "
+                        f"you passed a `{type(items).__name__}`")
+    items = list(items)
+
+    if threshold is not None:
+        score_column = PARTITIONS[name]
+        where = (lambda frame: frame[score_column] >= threshold) if where is None else \
+            (lambda frame, _where=where: _where(frame) & (frame[score_column] >= threshold))
+
+    store = open_store(name)
+    chunksize = _chunksize if chunksize is None else chunksize
+    if store is None and chunksize and name not in _cache:
+        return _scan(name, by, items, columns, where, chunksize)
+
+    # CSV数据集只读取一次，未被缓存时不使用索引，直接以isin筛选
+    table = load(name) if store is None else None
+
+    # 查找索引仅用于字符串ID，items中含有非字符串（如NaN）时与pandas.Series.isin一样逐行比较
+    key_index = index(name, by, table) if all(isinstance(item, str) for item in items) else None
+
+    # 高于阈值的行少于与items匹配的行时，仅在高分部分中匹配items
+    scores = None if threshold is None else threshold_index(name, table)
+    if scores is not None and (key_index is None or scores.count(threshold) < key_index.count(items)):
+        rows = scores.head(threshold)
+    else:
+        rows = None
+
+    if store is not None:
+        if rows is not None:
+            rows = rows[store.mask(by, items, rows)]
+        elif key_index is not None:
+            rows = key_index.positions(items)
+        else:
+            rows = store.mask(by, items)
+        selected = store.frame(columns if where is None else None, store.restore(rows))
+    else:
+        if rows is not None:
+            rows = np.sort(rows[table[by].iloc[rows].isin(items).to_numpy()])
+        elif key_index is not None:
+            rows = key_index.positions(items)
+        else:
+            rows = table[by].isin(items).to_numpy()
+        selected = table.iloc[rows] if rows.dtype != bool else table.loc[rows]
+
+    if where is not None:
+        selected = selected.loc[where(selected)]
+    selected = _decode(selected.loc[:, selected.columns if columns is None else columns].copy())
+    selected.index = range(selected.shape[0])
+    return selected
+
+
+def preload(names=None):
+    """
+        预先读取数据集并放入缓存，适用于服务启动或进程池创建之前。
+        Read datasets into the cache in advance, e.g. before a service starts or a process pool is created.
+
+        Args:
+            names (collections.abc.Iterable): 要读取的数据集名称，默认为None，即读取所有存在的数据集。
+            Names of the datasets to be read, None by default, i.e. all existing datasets are read.
+
+        Examples:
+            >>> preload(['formula', 'formula_tcm_links', 'tcm'])
+    """
+    if names is None:
+        names = [name for name in TABLES if os.path.exists(path(name)) or open_store(name) is not None]
+    for name in names:
+        load(name)
+
+
+def clear(names=None):
+    """
+        清空缓存。
+        Clear the cache.
+
+        Args:
+            names (collections.abc.Iterable): 要移出缓存的数据集名称，默认为None，即清空全部缓存。
+            Names of the datasets to be removed from the cache, None by default, i.e. the whole cache is cleared.
+    """
+    global _cache_bytes
+    with _lock:
+        for name in list(_cache) if names is None else names:
+            if name in _cache:
+                _cache_bytes -= _cache.pop(name)[2]
+        for key in list(_stores):
+            if names is None or key[0] in names:
+                _stores.pop(key)
+
+
+def set_cache_limit(nbytes):
+    """
+        设置缓存的内存上限（字节），超出上限时按LRU顺序淘汰数据集。
+        Set the memory budget of the cache in bytes. Datasets are evicted in LRU order when the budget is exceeded.
+
+        Args:
+            nbytes (int): 内存上限，为0时不缓存任何数据集。Memory budget, nothing is cached if it is 0.
+    """
+    global _cache_limit
+    with _lock:
+        _cache_limit = int(nbytes)
+        _evict(_cache_limit)
+
+
+def set_chunksize(chunksize):
+    """
+        设置select在数据集未被缓存时分块读取CSV的每块行数，适用于内存较小的机器。
+        Set the number of rows per chunk with which select reads uncached CSV datasets,
+        which suits machines with little memory.
+
+        Args:
+            chunksize (int): 每块的行数，为None时不分块读取。Number of rows per chunk, None to read CSVs as a whole.
+    """
+    global _chunksize
+    _chunksize = chunksize
+
+
+def data_dir() -> str:
+    """
+        返回当前数据集所在的目录。
+        Return the directory of the current datasets.
+
+        Returns:
+            str: 数据集所在的目录。Directory of the datasets.
+    """
+    return _data_dir
+
+
+def set_data_dir(directory=None):
+    """
+        设置数据集所在的目录（如由benchmarks/generate_data.py生成的放大数据集），并清空缓存。
+        get中的各函数及分析流程随后均读取该目录中的数据集；目录同时写入环境变量HERBIV_DATA_DIR，
+        以便之后创建的子进程使用相同的数据集。
+        Set the directory of the datasets (e.g. a scaled-up dataset written by benchmarks/generate_data.py)
+        and clear the cache. The functions in get and the analysis pipelines then read the datasets in
+        this directory; the directory is also written to the environment variable HERBIV_DATA_DIR,
+        so that subprocesses created afterwards use the same datasets.
+
+        Args:
+            directory (str): 数据集所在的目录，为None时恢复为默认的herbiv/data。
+            Directory of the datasets, None to restore the default herbiv/data.
+
+        Examples:
+            >>> set_data_dir('/data/herbiv_x10')
+    """
+    global _data_dir, _shared_dir
+    directory = DEFAULT_DATA_DIR if directory is None else os.path.abspath(directory)
+    if not os.path.isdir(directory):
+        raise FileNotFoundError(f"HerbiV data directory not found: {directory}")
+    with _lock:
+        _data_dir = directory
+        _shared_dir = None
+        clear()
+    os.environ.pop('HERBIV_SHARED_DIR', None)
+    if directory == DEFAULT_DATA_DIR:
+        os.environ.pop('HERBIV_DATA_DIR', None)
+    else:
+        os.environ['HERBIV_DATA_DIR'] = directory
+
+
+def version() -> str:
+    """
+        返回当前数据集的版本标识，由数据集目录及各数据集文件（或其列式存储对应的CSV）的修改时间和大小计算得到，
+        切换目录或任一数据集发生变化后即改变。
+        Return a version tag of the current datasets, computed from the data directory and the modification time
+        and size of each dataset file (or of the CSV its columnar store was converted from);
+        it changes whenever the directory or a dataset changes.
+
+        Returns:
+            str: 版本标识（十六进制摘要）。Version tag (hexadecimal digest).
+    """
+    stats = {}
+    for name in TABLES:
+        store = open_store(name)
+        if store is not None:
+            stats[name] = list(store.meta['source'])
+        elif os.path.exists(path(name)):
+            stats[name] = list(_stat(path(name)))
+    stats['data_dir'] = os.path.abspath(_data_dir)
+    return hashlib.sha1(json.dumps(stats, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def cache_info() -> dict:
+    """
+        返回缓存的状态。
+        Return the state of the cache.
+
+        Returns:
+            dict: 已缓存的数据集（按最近使用顺序）、占用的内存和内存上限。
+            Cached datasets (from least to most recently used), memory usage and memory budget.
+    """
+    with _lock:
+        return {'tables': list(_cache), 'bytes': _cache_bytes, 'limit': _cache_limit}
+
+
+if __name__ == '__main__':
+    import sys
+
+    # python -m herbiv.dataset [数据集名称...]：将数据集转换为列式存储
+    convert(sys.argv[1:] or None)
@@ -1,5 +1,5 @@
 import pandas as pd
-import os
+from herbiv import dataset
 
 
 # TODO: 为各函数增加抛出异常功能，若无法查询到相关信息，则抛出异常。
@@ -22,14 +22,8 @@ def get_formula(by, items) -> pd.DataFrame:
             0  HVP1625  ...   shang han lun
             [1 rows x 6 columns]
     """
-    # 读取HerbiV_formula数据集
-    formula_all = pd.read_csv(os.path.dirname(os.path.abspath(__file__)) + r'/data/HerbiV_formula.csv')
-
-    # 在数据集中获取items中复方的信息
-    formula = formula_all.loc[formula_all[by].isin(items)].copy()
-
-    # 重新设置索引
-    formula.index = range(formula.shape[0])
+    # 在HerbiV_formula数据集中获取items中复方的信息
+    formula = dataset.select('formula', by, items)
 
     return formula
 
@@ -59,15 +53,8 @@ def get_formula_tcm_links(by, items) -> pd.DataFrame:
             5  HVP1625  HVM4463
     """
 
-    # 读取HerbiV_formula_tcm_links数据集
-    formula_tcm_links_all = pd.read_csv(os.path.dirname(os.path.abspath(__file__)) +
-                                        r'/data/HerbiV_formula_tcm_links.csv')
-
-    # 在数据集中获取items中复方/中药的复方-中药连接信息
-    formula_tcm_links = formula_tcm_links_all.loc[formula_tcm_links_all[by].isin(items)].copy()
-
-    # 重新设置索引
-    formula_tcm_links.index = range(formula_tcm_links.shape[0])
+    # 在HerbiV_formula_tcm_links数据集中获取items中复方/中药的复方-中药连接信息
+    formula_tcm_links = dataset.select('formula_tcm_links', by, items)
 
     return formula_tcm_links
 
@@ -92,14 +79,8 @@ def get_tcm(by, items) -> pd.DataFrame:
             [2 rows x 19 columns]
     """
 
-    # 读取HerbiV_tcm数据集
-    tcm_all = pd.read_csv(os.path.dirname(os.path.abspath(__file__)) + r'/data/HerbiV_tcm.csv')
-
-    # 在数据集中获取items中中药的信息
-    tcm = tcm_all.loc[tcm_all[by].isin(items)].copy()
-
-    # 重新设置索引
-    tcm.index = range(tcm.shape[0])
+    # 在HerbiV_tcm数据集中获取items中中药的信息
+    tcm = dataset.select('tcm', by, items)
 
     return tcm
 
@@ -134,15 +115,8 @@ def get_tcm_chem_links(by, items) -> pd.DataFrame:
             [316 rows x 2 columns]
     """
 
-    # 读取HerbiV_tcm_chemical_links数据集
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    tcm_chem_links_all = pd.read_csv(current_directory + r'/data/HerbiV_tcm_chemical_links.csv')
-
-    # 在数据集中获取items中中药/化合物的中药-成分连接信息
-    tcm_chem_links = tcm_chem_links_all.loc[tcm_chem_links_all[by].isin(items)].copy()
-
-    # 重新设置索引
-    tcm_chem_links.index = range(tcm_chem_links.shape[0])
+    # 在HerbiV_tcm_chemical_links数据集中获取items中中药/化合物的中药-成分连接信息
+    tcm_chem_links = dataset.select('tcm_chem_links', by, items)
 
     return tcm_chem_links
 
@@ -177,12 +151,8 @@ def get_chemicals(by, items) -> pd.DataFrame:
             [258 rows x 8 columns]
     """
 
-    # 读取HerbiV_chemical_protein_links数据集
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    chem_all = pd.read_csv(current_directory + r'/data/HerbiV_chemicals.csv')
-
-    # 在数据集中获取items中化合物的信息
-    chem = chem_all.loc[chem_all[by].isin(items)].drop_duplicates(subset=['HVCID'])
+    # 在HerbiV_chemicals数据集中获取items中化合物的信息
+    chem = dataset.select('chemicals', by, items).drop_duplicates(subset=['HVCID'])
 
     # 重新设置索引
     chem.index = range(chem.shape[0])
@@ -190,7 +160,7 @@ def get_chemicals(by, items) -> pd.DataFrame:
     return chem
 
 
-def get_chem_protein_links(by, items, score=900) -> pd.DataFrame:
+def get_chem_protein_links(by, items, score=900, chunksize=None) -> pd.DataFrame:
     """
         读取HerbiV_chemical_protein_links数据集，
         返回items中化合物/蛋白的化合物-靶点（蛋白）连接的combined_score(s)大于等于score的连接信息。
@@ -203,6 +173,11 @@ def get_chem_protein_links(by, items, score=900) -> pd.DataFrame:
             items (collections.abc.Iterable): 要查询的化合物/蛋白。Chemical(s)/protein(s) to be queried.
             score (int): 仅combined_score大于等于score的记录会被筛选出，默认为900，最大为1000，最小为0。
             Record(s) with combined_score no less than score will be filtered out, 900 by default.
+            chunksize (int): 分块读取时每块的行数，默认为None，即使用dataset.set_chunksize的设置。
+            指定后若数据集未被缓存，则逐块应用by/items和score筛选，内存峰值由chunksize决定。
+            Number of rows per chunk, None by default, i.e. the value of dataset.set_chunksize is used.
+            If set and the dataset is not cached, the by/items and score filters are applied chunk by chunk,
+            so that peak memory is bounded by chunksize.
 
         Returns:
             pandas.DataFrame: items中化合物/蛋白的化合物-靶点（蛋白）连接的combined_score大于等于score的连接信息。
@@ -217,22 +192,11 @@ def get_chem_protein_links(by, items, score=900) -> pd.DataFrame:
             1  HVC0159  ENSP00000335062           0.795
     """
 
-    # 读取HerbiV_chemical_protein_links数据集
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    chem_protein_links_all = pd.read_csv(current_directory + r'/data/HerbiV_chemical_protein_links.csv')
-
-    # 在数据集中获取items中化合物/蛋白的化合物-靶点（蛋白）连接的combined_score大于等于score的连接信息
-    chem_protein_links = chem_protein_links_all.loc[
-        (chem_protein_links_all[by].isin(items)) &
-        (chem_protein_links_all['Combined_score'] >= score)].copy()
+    # 在HerbiV_chemical_protein_links数据集中获取items中化合物/蛋白的化合物-靶点（蛋白）连接的combined_score大于等于score的连接信息
+    chem_protein_links = dataset.select('chem_protein_links', by, items, chunksize=chunksize, threshold=score)
 
     # 将Combined_score变换为0-1的浮点数
-    chem_protein_links['Combined_score'] = chem_protein_links['Combined_score'].astype(float)
-    chem_protein_links.loc[:, 'Combined_score'] = chem_protein_links.loc[:, 'Combined_score'].apply(
-        lambda x: x / 1000)
-
-    # 重新设置索引
-    chem_protein_links.index = range(chem_protein_links.shape[0])
+    chem_protein_links['Combined_score'] = chem_protein_links['Combined_score'] / 1000
 
     return chem_protein_links
 
@@ -255,12 +219,8 @@ def get_proteins(by, items) -> pd.DataFrame:
             0  ENSP00000335062  ...  PDCD1 PD1
     """
 
-    # 读取HerbiV_proteins数据集
-    current_directory = os.path.dirname(os.path.abspath(__file__))
-    proteins_all = pd.read_csv(current_directory + r'/data/HerbiV_proteins.csv')
-
-    # 在数据集中获取items中蛋白的信息
-    proteins = proteins_all.loc[proteins_all[by].isin(items)].drop_duplicates(subset=['Ensembl_ID'])
+    # 在HerbiV_proteins数据集中获取items中蛋白的信息
+    proteins = dataset.select('proteins', by, items).drop_duplicates(subset=['Ensembl_ID'])
 
     # 重置索引
     proteins.index = range(proteins.shape[0])
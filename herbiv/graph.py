@@ -0,0 +1,188 @@
+import numpy as np
+import pandas as pd
+
+# 各层连接的起点类型、终点类型及其在连接信息中对应的列名。
+# Source node type, target node type and the corresponding columns in the links of each layer.
+LAYERS = {
+    'formula_tcm': ('formula', 'tcm', 'HVPID', 'HVMID'),
+    'tcm_chem': ('tcm', 'chem', 'HVMID', 'HVCID'),
+    'chem_protein': ('chem', 'protein', 'HVCID', 'Ensembl_ID'),
+}
+
+# 从复方到蛋白的节点类型顺序。Node types in order from formulas to proteins.
+KINDS = ('formula', 'tcm', 'chem', 'protein')
+
+
+def _ranges(indptr, rows):
+    """返回CSR中rows各行的下标（按行拼接）及各行的长度。"""
+    starts, counts = indptr[rows], indptr[rows + 1] - indptr[rows]
+    offsets = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+    return offsets + np.arange(offsets.shape[0]), counts
+
+
+def _member(codes, n):
+    """长度为n的布尔数组，codes中的位置为True，用于以下标代替isin判断编码是否在codes中。"""
+    member = np.zeros(n, dtype=bool)
+    member[np.asarray(codes, dtype=np.int64)] = True
+    return member
+
+
+def _order(codes, n):
+    """codes（0至n - 1的编码）的稳定排序下标。以16位为一段做基数排序（NumPy对16位整数使用基数排序），耗时与长度成线性关系。"""
+    if n <= 1 << 16:
+        return np.argsort(codes.astype(np.uint16), kind='stable')
+    low = np.argsort((codes & 0xFFFF).astype(np.uint16), kind='stable')
+    return low[np.argsort((codes[low] >> 16).astype(np.uint16), kind='stable')]
+
+
+class CSR:
+    """
+        以CSR（压缩稀疏行）格式存储的一层连接。
+        One layer of links stored in CSR (compressed sparse row) format.
+
+        Attributes:
+            indptr (numpy.ndarray): 第i个起点的连接位于indices[indptr[i]:indptr[i + 1]]。
+            The links of the i-th source node are indices[indptr[i]:indptr[i + 1]].
+            indices (numpy.ndarray): 各连接终点的编码。Codes of the target node of each link.
+    """
+
+    def __init__(self, src, dst, n_src):
+        order = _order(src, n_src)
+        self.indptr = np.concatenate(([0], np.cumsum(np.bincount(src, minlength=n_src)))).astype(np.int64)
+        self.indices = dst[order]
+
+    def edges(self, rows):
+        """返回rows各行的连接（起点, 终点）。"""
+        positions, counts = _ranges(self.indptr, rows)
+        return np.repeat(rows, counts), self.indices[positions]
+
+
+class HerbGraph:
+    """
+        复方-中药-化合物-蛋白的整数编码图。
+        各类节点的HVPID/HVMID/HVCID/Ensembl_ID被映射为从0开始的连续整数编码，每层连接以CSR邻接数组存储，
+        逐层遍历因而只需数组切片，无需反复筛选DataFrame。analysis.dfs_filter以此筛选有效节点。
+        Integer-coded graph of formulas, TCM, chemicals and proteins.
+        The HVPID/HVMID/HVCID/Ensembl_ID of each node type are mapped to dense integer codes starting from 0
+        and each layer of links is stored as CSR adjacency arrays, so that layer-by-layer traversal becomes
+        array slicing instead of DataFrame filtering. analysis.dfs_filter uses it to find the valid nodes.
+
+        Args:
+            formula_tcm_links (pandas.DataFrame): 复方-中药连接信息，可为None。Formula-TCM links, may be None.
+            tcm_chem_links (pandas.DataFrame): 中药-化合物连接信息。TCM-chemical links.
+            chem_protein_links (pandas.DataFrame): 化合物-蛋白连接信息，可为None。Chemical-protein links, may be None.
+
+        Examples:
+            >>> from herbiv import get
+            >>> formula_tcm_links = get.get_formula_tcm_links('HVPID', ['HVP1625'])
+            >>> g = HerbGraph(formula_tcm_links, get.get_tcm_chem_links('HVMID', formula_tcm_links['HVMID']))
+            >>> tcm = g.expand('formula_tcm', g.encode('formula', ['HVP1625']))
+            >>> g.decode('tcm', tcm)
+            array(['HVM0367', 'HVM0735', 'HVM0766', 'HVM1695', 'HVM3203', 'HVM4463'], dtype=object)
+    """
+
+    def __init__(self, formula_tcm_links=None, tcm_chem_links=None, chem_protein_links=None):
+        links = {'formula_tcm': formula_tcm_links, 'tcm_chem': tcm_chem_links, 'chem_protein': chem_protein_links}
+
+        # 为各类节点建立编码：编码即节点在ids[kind]中的位置。同类节点的各列拼接后一次分解，每列只哈希一次
+        columns = {kind: [] for kind in KINDS}
+        for layer, (src_kind, dst_kind, src_col, dst_col) in LAYERS.items():
+            if links[layer] is not None:
+                columns[src_kind].append((layer, 0, links[layer][src_col].to_numpy()))
+                columns[dst_kind].append((layer, 1, links[layer][dst_col].to_numpy()))
+        self.ids = {}
+        ends = {layer: [None, None] for layer in LAYERS}
+        for kind, parts in columns.items():
+            if not parts:
+                self.ids[kind] = np.array([], dtype=object)
+                continue
+            codes, uniques = pd.factorize(np.concatenate([values for _, _, values in parts]))
+            # 缺失值同样作为一个节点，位于ids[kind]末尾
+            missing = codes < 0
+            if missing.any():
+                codes[missing] = len(uniques)
+                uniques = np.append(np.asarray(uniques, dtype=object), np.nan)
+            self.ids[kind] = np.asarray(uniques)
+            bounds = np.cumsum([0] + [len(values) for _, _, values in parts])
+            for (layer, side, _), start, stop in zip(parts, bounds[:-1], bounds[1:]):
+                ends[layer][side] = codes[start:stop].astype(np.int64)
+        self._codes = {kind: pd.Index(v) for kind, v in self.ids.items()}
+
+        # 每层连接的起点、终点编码；CSR邻接数组在首次遍历该层时建立
+        self._links = {layer: tuple(ends[layer]) for layer in LAYERS if links[layer] is not None}
+        self.csr = {}
+
+    def _csr(self, layer) -> CSR:
+        """返回layer层的CSR邻接数组，首次使用时建立。"""
+        if layer not in self.csr:
+            src, dst = self._links[layer]
+            self.csr[layer] = CSR(src, dst, len(self.ids[LAYERS[layer][0]]))
+        return self.csr[layer]
+
+    def encode(self, kind, items) -> np.ndarray:
+        """
+            将kind类节点的ID编码为整数，图中不存在的ID被忽略。
+            Encode the IDs of kind nodes as integers; IDs absent from the graph are ignored.
+
+            Args:
+                kind (str): 节点类型，为KINDS之一。Node type, one of KINDS.
+                items (collections.abc.Iterable): 节点的ID。IDs of the nodes.
+
+            Returns:
+                numpy.ndarray: 去重后的编码。Unique codes.
+        """
+        codes = self._codes[kind].get_indexer(pd.unique(np.asarray(list(items), dtype=object)))
+        return codes[codes >= 0]
+
+    def decode(self, kind, codes) -> np.ndarray:
+        """
+            将kind类节点的编码还原为ID。
+            Decode the codes of kind nodes back to IDs.
+
+            Args:
+                kind (str): 节点类型，为KINDS之一。Node type, one of KINDS.
+                codes (numpy.ndarray): 节点的编码。Codes of the nodes.
+
+            Returns:
+                numpy.ndarray: 节点的ID。IDs of the nodes.
+        """
+        return self.ids[kind][np.asarray(codes, dtype=np.int64)]
+
+    def edges(self, layer, codes):
+        """
+            返回layer层中以codes为起点的连接。
+            Return the links of the layer starting from codes.
+
+            Args:
+                layer (str): 层名，为LAYERS的键之一。Name of the layer, one of the keys of LAYERS.
+                codes (numpy.ndarray): 起点的编码。Codes of the source nodes.
+
+            Returns:
+                tuple: 起点编码及终点编码。Codes of the source nodes and of their neighbours.
+        """
+        return self._csr(layer).edges(np.asarray(codes, dtype=np.int64))
+
+    def expand(self, layer, codes) -> np.ndarray:
+        """
+            返回codes中节点在layer层中的全部邻居（去重并排序）。
+            Return all neighbours (unique and sorted) of the nodes in codes in the layer.
+        """
+        return np.unique(self.edges(layer, codes)[1])
+
+    def degree(self, layer) -> np.ndarray:
+        """
+            返回各起点在layer层中的连接数，按编码排列。
+            Return the number of links of each source node in the layer, ordered by code.
+        """
+        src, _ = self._links[layer]
+        return np.bincount(src, minlength=len(self.ids[LAYERS[layer][0]]))
+
+    def mask(self, layer, src_codes, dst_codes) -> np.ndarray:
+        """
+            返回建图所用的layer层连接信息中，起点在src_codes中且终点在dst_codes中的行的布尔掩码。
+            Return the boolean mask of the rows of the links of the layer the graph was built from
+            whose source is in src_codes and whose target is in dst_codes.
+        """
+        src, dst = self._links[layer]
+        src_kind, dst_kind = LAYERS[layer][:2]
+        return _member(src_codes, len(self.ids[src_kind]))[src] & _member(dst_codes, len(self.ids[dst_kind]))[dst]
@@ -1,7 +1,6 @@
 import os
+import numpy as np
 import pandas as pd
-from pyecharts import options as opts
-from pyecharts.charts import Graph
 
 
 def re_name(tcm, tcm_chem_links, chem, chem_protein_links, protein):
@@ -14,40 +13,16 @@ def re_name(tcm, tcm_chem_links, chem, chem_protein_links, protein):
     :return: 返回清洗过的数据
     """
     tcm_c = tcm.copy()
-    tcm_chem_links_c = tcm_chem_links.copy()
     chem_c = chem.copy()
-    chem_protein_links_c = chem_protein_links.copy()
     protein_c = protein.copy()
 
-    out_chem_protein_links = chem_protein_links_c.iloc[:, 0:2]
-    out_chem_protein_links.columns = ['SourceNode', 'TargetNode']
+    # ID -> 名称的映射（ID重复时取第一条记录），一次性替换每列，无法匹配的行被删除
+    chem_names = _names(chem_c, 'HVCID', 'Name')
+    protein_names = _names(protein_c, 'Ensembl_ID', 'gene_name')
+    tcm_names = _names(tcm_c, 'HVMID', 'cn_name')
 
-    out_chem_protein_links.loc[:, 'SourceNode'] = out_chem_protein_links.loc[:, 'SourceNode'].apply(
-        lambda x: chem_c.loc[chem_c['HVCID'] == x]['Name'].iloc[0] if len(
-            chem_c.loc[chem_c['HVCID'] == x]['Name']) > 0 else None)
-
-    out_chem_protein_links.dropna(subset=['SourceNode'], inplace=True)
-
-    out_chem_protein_links.loc[:, 'TargetNode'] = out_chem_protein_links.loc[:, 'TargetNode'].apply(
-        lambda x: protein_c.loc[protein_c['Ensembl_ID'] == x]['gene_name'].iloc[0] if len(
-            protein_c.loc[protein_c['Ensembl_ID'] == x]['gene_name']) > 0 else None)
-
-    out_chem_protein_links.dropna(subset=['TargetNode'], inplace=True)
-
-    out_tcm_chem = tcm_chem_links_c.iloc[:, 0:2]
-    out_tcm_chem.columns = ['SourceNode', 'TargetNode']
-
-    out_tcm_chem.loc[:, 'SourceNode'] = out_tcm_chem.loc[:, 'SourceNode'].apply(
-        lambda x: tcm_c.loc[tcm_c['HVMID'] == x]['cn_name'].iloc[0] if len(
-            tcm_c.loc[tcm_c['HVMID'] == x]['cn_name']) > 0 else None)
-
-    out_tcm_chem.dropna(subset=['SourceNode'], inplace=True)
-
-    out_tcm_chem.loc[:, 'TargetNode'] = out_tcm_chem.loc[:, 'TargetNode'].apply(
-        lambda x: chem_c.loc[chem_c['HVCID'] == x]['Name'].iloc[0] if len(
-            chem_c.loc[chem_c['HVCID'] == x]['Name']) > 0 else None)
-
-    out_tcm_chem.dropna(subset=['TargetNode'], inplace=True)
+    out_chem_protein_links = _map_links(chem_protein_links, chem_names, protein_names)
+    out_tcm_chem = _map_links(tcm_chem_links, tcm_names, chem_names)
 
     out_chem = chem_c.loc[:, ['Name']]
     out_chem.columns = ['Key']
@@ -64,6 +39,21 @@ def re_name(tcm, tcm_chem_links, chem, chem_protein_links, protein):
     return out_tcm, out_tcm_chem, out_chem, out_chem_protein_links, out_gene
 
 
+def _names(frame, by, name):
+    """返回frame中by列到name列的映射，by重复时取第一条记录。"""
+    names = frame.drop_duplicates(subset=[by])
+    return pd.Series(names[name].to_numpy(), index=names[by].to_numpy())
+
+
+def _map_links(links, source_names, target_names):
+    """将连接信息的前两列按source_names和target_names替换为名称，删除无法匹配（或名称缺失）的行。"""
+    out = links.iloc[:, 0:2].copy()
+    out.columns = ['SourceNode', 'TargetNode']
+    out['SourceNode'] = out['SourceNode'].map(source_names).astype(object)
+    out['TargetNode'] = out['TargetNode'].map(target_names).astype(object)
+    return out.dropna(subset=['SourceNode', 'TargetNode'])
+
+
 def out_for_cyto(tcm, tcm_chem_links, chem, chem_protein_links, protein, path='result'):
     """
     输出Cytoscape用于作图的网络文件和属性文件
@@ -88,7 +78,7 @@ def out_for_cyto(tcm, tcm_chem_links, chem, chem_protein_links, protein, path='r
     pd.concat([tcm, chem, protein]).to_csv(os.path.join(path, "Type.csv"), index=False)
 
 
-def vis(tcm, tcm_chem_links, chem, chem_protein_links, protein, path='result'):
+def vis(tcm, tcm_chem_links, chem, chem_protein_links, protein, path='result', top=None, max_bytes=None):
     """
     使用pyecharts可视化分析结果
     :param tcm: pd.DataFrame类型，中药信息
@@ -97,42 +87,98 @@ def vis(tcm, tcm_chem_links, chem, chem_protein_links, protein, path='result'):
     :param chem_protein_links: pd.DataFrame类型，化合物（中药成分）-蛋白质（靶点）连接信息
     :param protein: pd.DataFrame类型，蛋白质（靶点）连接信息
     :param path: 字符串类型，存放结果的目录
+    :param top: int或dict类型，仅保留Importance Score（无该列时为连接数）最高的前top个中药、化合物和蛋白，
+                dict时分别指定，如{'tcm': 20, 'chem': 100, 'protein': 50}，默认为None，即保留全部节点
+    :param max_bytes: int类型，html文件的大小上限（字节），超出时将各类节点的保留数减半后重新绘制，默认为None，即不限制
     """
     # 若无path目录，先创建该目录
     if not os.path.exists(path):
         os.mkdir(path)
 
+    if top is not None:
+        tcm, tcm_chem_links, chem, chem_protein_links, protein = \
+            prune(tcm, tcm_chem_links, chem, chem_protein_links, protein, top)
+
+    file = os.path.join(path, "Graph.html")
+    _render(tcm, tcm_chem_links, chem, chem_protein_links, protein, file)
+
+    # 超出大小上限时减少节点后重新绘制
+    while max_bytes is not None and os.path.getsize(file) > max_bytes:
+        counts = {'tcm': tcm.shape[0], 'chem': chem.shape[0], 'protein': protein.shape[0]}
+        if max(counts.values()) <= 1:
+            break
+        tcm, tcm_chem_links, chem, chem_protein_links, protein = \
+            prune(tcm, tcm_chem_links, chem, chem_protein_links, protein,
+                  {kind: max(count // 2, 1) for kind, count in counts.items()})
+        _render(tcm, tcm_chem_links, chem, chem_protein_links, protein, file)
+
+
+def prune(tcm, tcm_chem_links, chem, chem_protein_links, protein, top):
+    """
+    仅保留Importance Score（无该列时为连接数）最高的前top个中药、化合物和蛋白及其之间的连接
+    :param tcm: pd.DataFrame类型，中药信息
+    :param tcm_chem_links: pd.DataFrame类型，中药-化合物（中药成分）连接信息
+    :param chem: pd.DataFrame类型，化合物（中药成分）信息
+    :param chem_protein_links: pd.DataFrame类型，化合物（中药成分）-蛋白质（靶点）连接信息
+    :param protein: pd.DataFrame类型，蛋白质（靶点）连接信息
+    :param top: int或dict类型，各类节点的保留数，dict的键为'tcm'、'chem'和'protein'，缺少的键不做限制
+    :return: 筛选后的tcm, tcm_chem_links, chem, chem_protein_links, protein
+    """
+    top = top if isinstance(top, dict) else {'tcm': top, 'chem': top, 'protein': top}
+
+    # 各类节点的连接数
+    degrees = {
+        'tcm': tcm_chem_links['HVMID'].value_counts(),
+        'chem': pd.concat([tcm_chem_links['HVCID'], chem_protein_links['HVCID']]).value_counts(),
+        'protein': chem_protein_links['Ensembl_ID'].value_counts(),
+    }
+
+    def keep(frame, kind, by):
+        if top.get(kind) is None or frame.shape[0] <= top[kind]:
+            return frame
+        if 'Importance Score' in frame.columns:
+            rank = frame['Importance Score']
+        else:
+            rank = frame[by].map(degrees[kind]).fillna(0)
+        # 稳定排序，分数相同时保持原有顺序
+        return frame.iloc[np.sort(np.argsort(-rank.to_numpy(dtype=float), kind='stable')[:top[kind]])]
+
+    tcm = keep(tcm, 'tcm', 'HVMID')
+    chem = keep(chem, 'chem', 'HVCID')
+    protein = keep(protein, 'protein', 'Ensembl_ID')
+    tcm_chem_links = tcm_chem_links.loc[tcm_chem_links['HVMID'].isin(tcm['HVMID']) &
+                                        tcm_chem_links['HVCID'].isin(chem['HVCID'])]
+    chem_protein_links = chem_protein_links.loc[chem_protein_links['HVCID'].isin(chem['HVCID']) &
+                                                chem_protein_links['Ensembl_ID'].isin(protein['Ensembl_ID'])]
+    return tcm, tcm_chem_links, chem, chem_protein_links, protein
+
+
+def _render(tcm, tcm_chem_links, chem, chem_protein_links, protein, file):
+    """将网络绘制为html文件file。"""
+    # pyecharts仅在绘图时导入，以加快herbiv的导入
+    from pyecharts import options as opts
+    from pyecharts.charts import Graph
+
     tcm, tcm_chem_links, chem, chem_protein_links, protein = \
         re_name(tcm, tcm_chem_links, chem, chem_protein_links, protein)
 
-    nodes = []
-    edges = []
-
     categories = [
         {"name": "中药", "color": "#61a0a8"},
         {"name": "化学成分", "color": "#f47920"},
         {"name": "靶点", "color": "#ca8622"},
     ]
 
-    for index, row in tcm_chem_links.iloc[0:].iterrows():
-        chinese_medicine = row[0]
-        chemical_component = row[1]
-        nodes.append({'name': chinese_medicine, "symbolSize": 20, 'category': 0, "color": "#1FA9E9"})
-        nodes.append({'name': chemical_component, "symbolSize": 20, 'category': 1, "color": "#FFFF00"})
-        edges.append({'source': chinese_medicine, 'target': chemical_component})
-
-    for index, row in chem_protein_links.iloc[0:].iterrows():
-        chemical_component = row[0]
-        target = row[1]
-        nodes.append({'name': chemical_component, "symbolSize": 20, 'category': 1, "color": "#FFFF00"})
-        nodes.append({'name': target, "symbolSize": 20, 'category': 2, "color": "#000000"})
-        edges.append({'source': chemical_component, 'target': target})
-
-    unique_list = list(set(tuple(item.items()) for item in nodes))
-    nodes = [dict(item) for item in unique_list]
+    # 各类节点按名称去重（不同类的同名节点分别保留），连接逐条保留
+    tcm_names = pd.unique(tcm_chem_links['SourceNode'])
+    chem_names = pd.unique(pd.concat([tcm_chem_links['TargetNode'], chem_protein_links['SourceNode']]))
+    protein_names = pd.unique(chem_protein_links['TargetNode'])
+    nodes = [{'name': name, "symbolSize": 20, 'category': 0, "color": "#1FA9E9"} for name in tcm_names] + \
+            [{'name': name, "symbolSize": 20, 'category': 1, "color": "#FFFF00"} for name in chem_names] + \
+            [{'name': name, "symbolSize": 20, 'category': 2, "color": "#000000"} for name in protein_names]
 
-    unique_list = list(set(tuple(item.items()) for item in nodes))
-    nodes = [dict(item) for item in unique_list]
+    links = pd.concat([tcm_chem_links, chem_protein_links])
+    edges = [{'source': source, 'target': target}
+             for source, target in zip(links['SourceNode'].tolist(), links['TargetNode'].tolist())]
 
     Graph(init_opts=opts.InitOpts(width="2400px", height="1200px")) \
         .add(
@@ -150,7 +196,7 @@ def vis(tcm, tcm_chem_links, chem, chem_protein_links, protein, path='result'):
         title_opts=opts.TitleOpts(title=''),
         legend_opts=opts.LegendOpts(orient="vertical", pos_left="2%", pos_top="20%")
     ) \
-        .render(path=os.path.join(path, "Graph.html"))
+        .render(path=file)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,111 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+class Report:
+    """
+        记录分析流程各阶段的耗时、内存峰值和行数。将其作为report参数传入analysis.from_tcm_or_formula或
+        analysis.from_proteins，分析结束后即可读取各阶段的记录。
+        Record the wall time, peak memory and row counts of each stage of an analysis pipeline.
+        Pass it as the report argument of analysis.from_tcm_or_formula or analysis.from_proteins
+        and read the records of the stages once the analysis has finished.
+
+        report参数也可以是任意可调用对象，每个阶段结束时以一条记录（dict）调用，便于将记录导出到其他监控系统。
+        The report argument may also be any callable, which is called with one record (dict) at the end
+        of each stage, so that the records can be exported to other metrics systems.
+
+        每条记录包含：Each record contains:
+            stage (str): 阶段名称，如get、dfs_filter、score、tcm_component、formula_component、out_for_cyto、vis，
+            从结果缓存中读取时的cache，以及analysis.batch_from_proteins中每组的target_set。
+            Name of the stage, e.g. get, dfs_filter, score, tcm_component, formula_component, out_for_cyto, vis,
+            cache when the results are read from the result cache, and target_set for each target set
+            of analysis.batch_from_proteins.
+            seconds (float): 耗时（秒）。Wall time in seconds.
+            peak_bytes (int): 该阶段中通过tracemalloc追踪到的内存峰值（字节），未追踪内存时为None。
+            Peak memory traced by tracemalloc during the stage in bytes, None if memory is not traced.
+            rows (dict): 该阶段输出的各表的行数。Number of rows of each table the stage outputs.
+
+        Args:
+            memory (bool): 是否在各阶段中以tracemalloc追踪内存峰值，默认为True。追踪内存会使分析变慢。
+            传入其他可调用对象时，仅在tracemalloc已启动时记录内存峰值。
+            Whether to trace the peak memory of each stage with tracemalloc, True by default.
+            Tracing memory slows the analysis down. For other callables the peak memory is only recorded
+            if tracemalloc has already been started.
+
+        Examples:
+            >>> from herbiv import analysis, report
+            >>> r = report.Report()
+            >>> analysis.from_proteins(['ENSP00000381588', 'ENSP00000252519'], random_state=138192, num=100, report=r)
+            >>> r.to_frame()
+                           seconds  peak_bytes  rows
+            stage
+            get              0.121     10234567  ...
+            ...
+            >>> analysis.from_tcm_or_formula(['HVP1625'], report=lambda record: print(record))
+    """
+
+    def __init__(self, memory=True):
+        self.memory = memory
+        self.records = []
+
+    def __call__(self, record):
+        self.records.append(record)
+
+    @property
+    def seconds(self) -> float:
+        """各阶段的总耗时（秒）。Total wall time of the stages in seconds."""
+        return sum(record['seconds'] for record in self.records)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+            以DataFrame返回各阶段的记录，行数为各表行数的和。
+            Return the records of the stages as a DataFrame, with the row counts of the tables summed up.
+        """
+        return pd.DataFrame([{'stage': record['stage'], 'seconds': record['seconds'],
+                              'peak_bytes': record['peak_bytes'], 'rows': sum(record['rows'].values())}
+                             for record in self.records],
+                            columns=['stage', 'seconds', 'peak_bytes', 'rows']).set_index('stage')
+
+
+def rows(**tables) -> dict:
+    """各表的行数，忽略为None的表。Row counts of the tables, tables that are None are skipped."""
+    return {name: int(table.shape[0]) for name, table in tables.items() if table is not None}
+
+
+@contextmanager
+def stage(report, name):
+    """
+        记录with语句块的耗时与内存峰值，结束时以记录调用report；report为None时不做任何事。
+        with语句返回的dict可用于设置该阶段输出的行数（rows键）。
+        Record the wall time and peak memory of the with block and call report with the record at its end;
+        do nothing if report is None. The dict returned by the with statement may be used to set the row counts
+        of the stage (key rows).
+    """
+    record = {'stage': name, 'seconds': None, 'peak_bytes': None, 'rows': {}}
+    if report is None:
+        yield record
+        return
+
+    # 未启动tracemalloc时，仅在report要求时于该阶段中临时启动
+    started = getattr(report, 'memory', False) and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        if tracing:
+            record['peak_bytes'] = tracemalloc.get_traced_memory()[1] - base
+        if started:
+            tracemalloc.stop()
+
+    report(record)
@@ -0,0 +1,224 @@
+"""
+检查缓存、列式存储与打分会话等优化后的实现与原实现的结果相同。
+Check that the optimised code paths (dataset cache, columnar stores, chunked reads, ScoreSession and
+the result cache) give the same results as the original implementations.
+
+    python -m pytest -q tests
+
+数据集取自herbiv/data，复制到临时目录后使用，不会在herbiv/data中写入列式存储；
+没有HerbiV_chemical_protein_links.csv时，以固定的随机数种子生成一份小规模的化合物-蛋白连接。
+The datasets of herbiv/data are used through a temporary directory, so no columnar store is written into
+herbiv/data; a small chemical-protein links table is generated with a fixed seed when
+HerbiV_chemical_protein_links.csv is not present.
+"""
+import os
+import shutil
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from herbiv import analysis, cache, compute, dataset, get
+
+warnings.simplefilter(action='ignore', category=FutureWarning)
+
+PROTEINS = ['ENSP00000381588', 'ENSP00000252519']
+
+
+@pytest.fixture(scope='module')
+def data_dir(tmp_path_factory):
+    """herbiv/data中数据集的临时副本，测试期间作为数据集目录。"""
+    directory = tmp_path_factory.mktemp('data')
+    for name, file in dataset.TABLES.items():
+        source = os.path.join(dataset.DEFAULT_DATA_DIR, file)
+        if os.path.exists(source):
+            shutil.copy(source, directory / file)
+        elif name == 'chem_protein_links':
+            _generate_links(directory / file)
+    dataset.set_data_dir(directory)
+    yield directory
+    dataset.set_data_dir(None)
+
+
+def _generate_links(file):
+    """生成化合物-蛋白连接：随机连接及与PROTEINS相连的连接，Combined_score为150-999的整数。"""
+    rng = np.random.default_rng(0)
+    chem = pd.read_csv(os.path.join(dataset.DEFAULT_DATA_DIR, dataset.TABLES['chemicals']))['HVCID'].unique()
+    proteins = pd.read_csv(os.path.join(dataset.DEFAULT_DATA_DIR, dataset.TABLES['proteins']))['Ensembl_ID'].unique()
+    n = 20000
+    pd.DataFrame({
+        'HVCID': rng.choice(chem, n),
+        'Ensembl_ID': np.concatenate([rng.choice(proteins, n - 600), rng.choice(PROTEINS, 600)]),
+        'Combined_score': rng.integers(150, 1000, n),
+    }).sample(frac=1, random_state=1).to_csv(file, index=False)
+
+
+# 0.2版本中get_chemicals与get_proteins按ID去重
+UNIQUE = {'chemicals': 'HVCID', 'proteins': 'Ensembl_ID'}
+
+
+def reference(directory, name, by, items, score=None):
+    """0.2版本get_*的实现：读取整个CSV后以isin筛选，Combined_score变换为0-1的浮点数。"""
+    table = pd.read_csv(os.path.join(directory, dataset.TABLES[name]))
+    mask = table[by].isin(items)
+    if score is not None:
+        mask &= table['Combined_score'] >= score
+    result = table.loc[mask].copy()
+    if name in UNIQUE:
+        result = result.drop_duplicates(subset=[UNIQUE[name]])
+    if score is not None:
+        result['Combined_score'] = result['Combined_score'].astype(float) / 1000
+    result.index = range(result.shape[0])
+    return result
+
+
+@pytest.fixture(params=['csv', 'chunked', 'store'])
+def mode(request, data_dir):
+    """以CSV（整体读取并缓存）、分块读取CSV（不缓存）或列式存储的方式读取数据集。"""
+    if request.param == 'chunked':
+        dataset.set_cache_limit(0)
+        dataset.set_chunksize(1000)
+    elif request.param == 'store':
+        dataset.convert()
+    dataset.clear()
+    yield request.param
+    dataset.set_chunksize(None)
+    dataset.set_cache_limit(1024 * 1024 * 1024)
+    for name in dataset.TABLES:
+        shutil.rmtree(dataset.store_path(name), ignore_errors=True)
+    dataset.clear()
+
+
+def _queries(directory):
+    """各get_*函数的查询：(函数, 数据集, by, items, score)，items中包含重复及不存在的ID。"""
+    links = pd.read_csv(os.path.join(directory, dataset.TABLES['chem_protein_links']))
+    chem = list(links['HVCID'].drop_duplicates().sample(50, random_state=0)) + ['HVC0385', 'HVC0385', 'missing']
+    tcm = ['HVM0367', 'HVM1695', 'HVM0367', 'missing']
+    return [
+        (get.get_formula, 'formula', 'HVPID', ['HVP1625', 'missing'], None),
+        (get.get_formula_tcm_links, 'formula_tcm_links', 'HVMID', tcm, None),
+        (get.get_tcm, 'tcm', 'HVMID', tcm, None),
+        (get.get_tcm_chem_links, 'tcm_chem_links', 'HVMID', tcm, None),
+        (get.get_tcm_chem_links, 'tcm_chem_links', 'HVCID', chem, None),
+        (get.get_chemicals, 'chemicals', 'HVCID', chem, None),
+        (get.get_proteins, 'proteins', 'Ensembl_ID', PROTEINS + ['missing'], None),
+        (get.get_chem_protein_links, 'chem_protein_links', 'Ensembl_ID', PROTEINS, 0),
+        (get.get_chem_protein_links, 'chem_protein_links', 'Ensembl_ID', PROTEINS, 990),
+        (get.get_chem_protein_links, 'chem_protein_links', 'HVCID', chem, 500),
+    ]
+
+
+def test_get_matches_reference(data_dir, mode):
+    for function, name, by, items, score in _queries(data_dir):
+        result = function(by, items) if score is None else function(by, items, score)
+        expected = reference(data_dir, name, by, items, score)
+        # 键列以整数编码缓存或存储，返回时须解码为字符串
+        assert not any(isinstance(dtype, pd.CategoricalDtype) for dtype in result.dtypes), (mode, name, by)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=mode != 'store', obj=f'{mode} {name} {by}')
+
+
+def _networks():
+    """正向与逆向分析中dfs_filter之后的网络：名称 -> (网络, score, 是否包含与蛋白相连的全部节点)。"""
+    return {
+        'formula': (analysis.dfs_filter(*analysis._forward_network(['HVP1625'], None, 0)), 0, False),
+        'formula+proteins': (analysis.dfs_filter(*analysis._forward_network(['HVP1625'], PROTEINS, 0)), 0, False),
+        'tcm': (analysis.dfs_filter(*analysis._forward_network(['HVM0367', 'HVM1695'], None, 0)), 0, False),
+        'tcm+proteins': (analysis.dfs_filter(*analysis._forward_network(['HVM0367', 'HVM1695'], PROTEINS, 0)), 0,
+                         False),
+        'protein': (analysis.dfs_filter(*analysis._reverse_network(PROTEINS[:1], 0)), 0, True),
+        'proteins': (analysis.dfs_filter(*analysis._reverse_network(PROTEINS, 0)), 0, True),
+        'proteins@900': (analysis.dfs_filter(*analysis._reverse_network(PROTEINS, 900)), 900, True),
+    }
+
+
+def _assert_results_equal(result, expected, obj):
+    for a, b in zip(result, expected):
+        if a is None or b is None:
+            assert a is None and b is None, obj
+        else:
+            pd.testing.assert_frame_equal(a, b, check_exact=False, rtol=1e-9, atol=1e-12, obj=obj)
+
+
+def test_score_session_matches_score(data_dir):
+    networks = _networks()
+    session = compute.ScoreSession()
+    # 同一个会话依次用于不同的网络，缓存的列只在覆盖新网络时复用
+    for name in ['formula+proteins', 'tcm+proteins', 'formula+proteins', 'protein', 'proteins', 'formula', 'tcm',
+                 'proteins@900', 'proteins', 'formula']:
+        (formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, _), score, complete = \
+            networks[name]
+        expected = compute.score(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links)
+        result = session.score(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links,
+                               score=score, complete=complete)
+        _assert_results_equal(result, expected, name)
+
+    session.discard(PROTEINS[:1], 0)
+    assert (PROTEINS[0], 0) not in session.proteins and (PROTEINS[0], 900) in session.proteins
+
+
+def test_score_session_add(data_dir):
+    session = compute.ScoreSession()
+    session.add(PROTEINS[:1], 0)
+    assert session.proteins == [(PROTEINS[0], 0)]
+    (formula, formula_tcm_links, tcm, tcm_chem_links, chem, chem_protein_links, _), _, _ = _networks()['proteins']
+    expected = compute.score(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links)
+    result = session.score(tcm, tcm_chem_links, chem, chem_protein_links, formula, formula_tcm_links)
+    _assert_results_equal(result, expected, 'add')
+    assert sorted(session.proteins) == sorted((protein, 0) for protein in PROTEINS)
+
+
+def test_from_proteins_session(data_dir):
+    options = dict(score=0, tcm_component=False, formula_component=False, out_for_cytoscape=False)
+    session = compute.ScoreSession()
+    for proteins in [PROTEINS[:1], PROTEINS, PROTEINS[1:]]:
+        _assert_results_equal(analysis.from_proteins(proteins, session=session, **options),
+                              analysis.from_proteins(proteins, **options), ' '.join(proteins))
+
+    target_sets = [PROTEINS[:1], PROTEINS, ['missing']]
+    for i, result in analysis.batch_from_proteins(target_sets, tcm_component=False, formula_component=False):
+        if target_sets[i] == ['missing']:
+            assert result is None
+        else:
+            _assert_results_equal(result, analysis.from_proteins(target_sets[i], **options), f'batch {i}')
+
+
+@pytest.fixture
+def result_cache(tmp_path, monkeypatch, data_dir):
+    """启用临时目录中的结果缓存，结束后恢复原设置。"""
+    monkeypatch.setattr(cache, '_directory', cache._directory)
+    monkeypatch.setattr(cache, '_limit', cache._limit)
+    cache.enable(str(tmp_path))
+    cache.clear()
+    yield tmp_path
+    cache.clear()
+
+
+def test_cache_key_normalisation(data_dir):
+    assert cache.key('f', ids=['HVM0367', 'HVM1695', 'HVM0367'], score=0) == \
+        cache.key('f', score=0, ids=('HVM1695', 'HVM0367'))
+    assert cache.key('f', weights={'a': 1, 'b': 2}) == cache.key('f', weights={'b': 2, 'a': 1})
+    assert cache.key('f', ids=['HVM0367'], score=0) != cache.key('f', ids=['HVM0367'], score=990)
+    assert cache.key('f', ids=['HVM0367']) != cache.key('g', ids=['HVM0367'])
+
+
+def test_cache_hit_matches_analysis(result_cache):
+    options = dict(score=0, out_for_cytoscape=False, out_graph=False)
+    expected = analysis.from_tcm_or_formula(['HVM0367', 'HVM1695'], **options)
+    result = analysis.from_tcm_or_formula(['HVM1695', 'HVM0367'], **options)
+    assert cache.info()['hits'] == 1
+    _assert_results_equal(result, expected, 'cache')
+
+
+def test_cache_evicts_least_recently_used(result_cache):
+    value = np.zeros(100 * 1024 // 8)
+    cache.enable(str(result_cache), max_mb=0.25)
+    cache.put('a', value)
+    cache.put('b', value)
+    # a比b写入得更早，但随后被读取过，因此先淘汰b
+    os.utime(result_cache / f'a{cache.SUFFIX}', (1000, 1000))
+    os.utime(result_cache / f'b{cache.SUFFIX}', (2000, 2000))
+    assert cache.get('a') is not None
+    cache.put('c', value)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert cache.info()['evictions'] == 1